@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# coding: utf-8
+"""
+Timing of the color detectors: cvtColor + inRange (hsv) against the BGR lookup tables (lut) at several
+table sizes, on the masks and profile ratios used by the classification, with the mask mismatch of each table.
+Runs on the given images, or on a random 2000x2800 frame.
+
+    python benchmarks/bench_detectors.py [--settings config/settings.yml] [--repeat <count>] [<image> ...]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "app"))
+
+import image_utils
+from bench_presence import SETTINGS_FILE, load_profiles
+
+
+def timed(function, repeat):
+    # median duration of repeat calls
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def benchmark_detectors(images, profiles, bits=(8, 6, 5), repeat=5):
+    """
+    Measure, per detector, the table build time (lut only) and the mean time per image of a single profile
+    mask and of the ratios of every profile. Returns {detector: timings}.
+    """
+    profile = profiles[0]
+    results = {
+        image_utils.DETECTOR_HSV: {
+            "build": 0.0,
+            "mask": statistics.mean(
+                timed(lambda: image_utils.get_color_mask(image, profile.lower_hsv, profile.upper_hsv), repeat)
+                for image in images
+            ),
+            "ratios": statistics.mean(
+                timed(lambda: image_utils.get_profile_ratios(image, profiles), repeat) for image in images
+            ),
+            "mismatch": 0.0,
+        }
+    }
+
+    for size in bits:
+        start = time.perf_counter()
+        detector = image_utils.ColorLookupDetector(profile.lower_hsv, profile.upper_hsv, bits=size)
+        profile_detector = image_utils.ProfileLookupDetector(
+            [(p.lower_hsv, p.upper_hsv) for p in profiles], bits=size
+        )
+        build = time.perf_counter() - start
+        results[image_utils.DETECTOR_LUT + str(size)] = {
+            "build": build,
+            "mask": statistics.mean(timed(lambda: detector.mask(image), repeat) for image in images),
+            "ratios": statistics.mean(timed(lambda: profile_detector.counts(image), repeat) for image in images),
+            "mismatch": statistics.mean(detector.check(image) for image in images),
+            "table_mb": (detector.lut.nbytes + profile_detector.lut.nbytes) / (1 << 20),
+        }
+
+    for name, timings in results.items():
+        logging.info(
+            "Detector " + name + ": mask " + "{:.4f}".format(timings["mask"]) + " s, ratios "
+            + "{:.4f}".format(timings["ratios"]) + " s, build " + "{:.3f}".format(timings["build"]) + " s, mismatch "
+            + "{:.4f}".format(timings["mismatch"] * 100) + " %"
+            + (", tables " + "{:.0f}".format(timings["table_mb"]) + " MB" if "table_mb" in timings else "")
+        )
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = argparse.ArgumentParser(description="Color detectors benchmark")
+    arguments.add_argument("images", nargs="*")
+    arguments.add_argument("--settings", default=SETTINGS_FILE)
+    arguments.add_argument("--repeat", type=int, default=5)
+    options = arguments.parse_args()
+
+    profiles, _ = load_profiles(options.settings)
+    if options.images:
+        images = [image_utils.load_image(path) for path in options.images]
+    else:
+        images = [np.random.default_rng(0).integers(0, 256, size=(2800, 2000, 3), dtype=np.uint8)]
+    benchmark_detectors(images, profiles, repeat=options.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# coding: utf-8
+"""
+Construction time, memory and serialization time of planning events.
+
+    python benchmarks/bench_events.py [--count <events>]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "app"))
+
+from image_parser import DanceEvent
+
+
+def benchmark_events(count=100000, event_class=DanceEvent):
+    """
+    Measure construction and serialization (to_json_storage, dict and short_infos) of count events.
+    Returns the timings and the memory allocated by the constructed events.
+    """
+    first = datetime(2022, 1, 1, 20, 0)
+    dates = [first + timedelta(hours=i) for i in range(count)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    events = [
+        event_class(start_date=day, end_date=day + timedelta(hours=3), description="Soirée WCS", dances=["WCS"])
+        for day in dates
+    ]
+    construct = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for event in events:
+        event.to_json_storage()
+        dict(event)
+        event.short_infos()
+    serialize = time.perf_counter() - start
+
+    logging.info(
+        "Events: " + str(count) + " constructed in " + "{:.3f}".format(construct) + " s ("
+        + "{:.0f}".format(memory / count) + " bytes/event), serialized in " + "{:.3f}".format(serialize) + " s"
+    )
+    return {"count": count, "construct": construct, "serialize": serialize, "bytes_per_event": memory / count}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = argparse.ArgumentParser(description="Events benchmark")
+    arguments.add_argument("--count", type=int, default=100000)
+    options = arguments.parse_args()
+
+    benchmark_events(options.count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# coding: utf-8
+"""
+Throughput of the OCR correction rules over a corpus of planning words.
+
+    python benchmarks/bench_ocr_corrections.py [--repeat <count>]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "app"))
+
+from ocr_corrections import CorrectionRules, FIELD_DATE, FIELD_DESCRIPTION, FIELD_TIME
+
+# words as read on planning posters, typos included
+CORPUS = (
+    [(FIELD_DATE, word) for word in ["12/11", "I2/II/2O22", "§/1T", "31/12/2022"]]
+    + [(FIELD_TIME, word) for word in ["20h30-24h00", "2Oh-O1h", "21:00", "T:3O"]]
+    + [
+        (FIELD_DESCRIPTION, word)
+        for word in ["soirée", "wes", "I'atelier", "lmpasse", "‘Salsa’", "'atelier", "d'été", "Rock", "Dj"]
+    ]
+) * 1000
+
+
+def benchmark_corrections(corpus, rules=None, repeat=10):
+    """
+    Measure correction throughput over a corpus of (field, word) pairs.
+    Returns words per second and the rule hit counters of a single pass over the corpus.
+    """
+    rules = rules or CorrectionRules()
+    for field, word in corpus:
+        rules.correct(field, word)
+    hits = rules.stats()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for field, word in corpus:
+            rules.correct(field, word)
+    duration = time.perf_counter() - start
+
+    words_per_second = len(corpus) * repeat / duration if duration else float("inf")
+    logging.info("OCR corrections: " + "{:.0f}".format(words_per_second) + " words/s")
+    return {"words_per_second": words_per_second, "hits": hits}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = argparse.ArgumentParser(description="OCR corrections benchmark")
+    arguments.add_argument("--repeat", type=int, default=10)
+    options = arguments.parse_args()
+
+    results = benchmark_corrections(CORPUS, repeat=options.repeat)
+    logging.info("Rule hits: " + str(results["hits"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+# coding: utf-8
+"""
+OCR latency of the pytesseract and tesserocr engines on the same prepared images.
+
+    python benchmarks/bench_ocr_engines.py [--tesseract <tesseract executable>] <image> [<image> ...]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "app"))
+
+import image_utils
+import ocr_engines
+from image_parser import DancePlanningParser
+
+
+def benchmark_ocr_engines(images, engines, config, repeat=1):
+    """
+    Measure per image OCR latency of each engine on the same prepared images.
+    The first image is processed once before timing so that one-off initialization is not measured.
+    """
+    results = {}
+    for name, engine in engines.items():
+        engine.image_to_data(images[0], config)
+
+        timings = []
+        for _ in range(repeat):
+            for image in images:
+                start = time.perf_counter()
+                engine.image_to_data(image, config)
+                timings.append(time.perf_counter() - start)
+
+        results[name] = {
+            "images": len(timings),
+            "total": sum(timings),
+            "mean": statistics.mean(timings),
+            "median": statistics.median(timings),
+        }
+        logging.info(
+            "OCR engine " + name + ": " + "{:.3f}".format(results[name]["mean"]) + " s/image (mean), "
+            + "{:.3f}".format(results[name]["median"]) + " s/image (median) over " + str(len(timings)) + " images"
+        )
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = argparse.ArgumentParser(description="OCR engines benchmark")
+    arguments.add_argument("images", nargs="+")
+    arguments.add_argument("--tesseract", default=None)
+    arguments.add_argument("--repeat", type=int, default=1)
+    options = arguments.parse_args()
+
+    parser = DancePlanningParser(options.tesseract)
+    images = [parser.prepare(image_utils.load_image(path)) for path in options.images]
+    engines = {ocr_engines.ENGINE_PYTESSERACT: ocr_engines.PytesseractEngine(options.tesseract)}
+    if ocr_engines.tesserocr is not None:
+        engines[ocr_engines.ENGINE_TESSEROCR] = ocr_engines.get_engine(ocr_engines.ENGINE_TESSEROCR, options.tesseract)
+    benchmark_ocr_engines(images, engines, DancePlanningParser.OCR_CONFIG, options.repeat)
+    for engine in engines.values():
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# coding: utf-8
+"""
+Per image report of the exact and coarse-to-fine color presence paths, with the detection profiles
+of the settings file: which path each image took and whether both assign the same profile and bucket.
+
+    python benchmarks/bench_presence.py [--settings config/settings.yml] [--margin <%>] <image> [<image> ...]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "app"))
+
+import image_utils
+from configuration import AppParserConfig, Config
+
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "settings.yml")
+
+
+def load_profiles(path=SETTINGS_FILE):
+    # detection profiles and presence settings as configured for the application
+    parser_config = AppParserConfig(Config.load(path))
+    profiles = [
+        image_utils.ColorProfile(
+            profile["name"],
+            image_utils.to_np_array(*profile["lower_hsv"]),
+            image_utils.to_np_array(*profile["upper_hsv"]),
+            profile["top_match"],
+            profile["med_match"],
+        )
+        for profile in parser_config.color_profiles
+    ]
+    return profiles, parser_config
+
+
+def compare_presence_methods(
+    paths, profiles, margin, coarse_width=image_utils.COARSE_WIDTH, detector=image_utils.DETECTOR_HSV
+):
+    """
+    Run both the exact and the coarse-to-fine classification on a corpus of images and report
+    which path each image took and whether both methods assign the same profile and bucket.
+    """
+    report = []
+    for path in paths:
+        image = image_utils.load_image(path)
+        exact = image_utils.get_profile_presences(image, profiles, detector)
+        estimate, method = image_utils.estimate_profile_presences(image, profiles, margin, coarse_width, detector)
+        exact_winner, exact_bucket = image_utils.select_profile(profiles, exact)
+        estimate_winner, estimate_bucket = image_utils.select_profile(profiles, estimate)
+        match = exact_winner == estimate_winner and exact_bucket == estimate_bucket
+        if not match:
+            logging.warning(
+                "Bucket mismatch: " + path
+                + " - exact " + profiles[exact_winner].name + " " + str(exact[exact_winner])
+                + " % (" + exact_bucket + ")"
+                + " / " + method + " " + profiles[estimate_winner].name + " " + str(estimate[estimate_winner])
+                + " % (" + estimate_bucket + ")"
+            )
+        report.append(
+            {
+                "path": path,
+                "method": method,
+                "exact": exact[exact_winner],
+                "estimate": estimate[estimate_winner],
+                "exact_profile": profiles[exact_winner].name,
+                "estimate_profile": profiles[estimate_winner].name,
+                "exact_bucket": exact_bucket,
+                "estimate_bucket": estimate_bucket,
+                "match": match,
+            }
+        )
+
+    coarse = sum(1 for row in report if row["method"] == image_utils.METHOD_COARSE)
+    mismatches = sum(1 for row in report if not row["match"])
+    logging.info(
+        "Presence methods: " + str(coarse) + "/" + str(len(report)) + " coarse, " + str(mismatches) + " mismatch(es)"
+    )
+    return report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = argparse.ArgumentParser(description="Exact vs coarse-to-fine color presence report")
+    arguments.add_argument("images", nargs="+")
+    arguments.add_argument("--settings", default=SETTINGS_FILE)
+    arguments.add_argument("--margin", type=float, default=None)
+    arguments.add_argument("--coarse-width", type=int, default=None)
+    arguments.add_argument("--detector", default=None)
+    options = arguments.parse_args()
+
+    profiles, parser_config = load_profiles(options.settings)
+    margin = options.margin if options.margin is not None else parser_config.coarse_margin
+    report = compare_presence_methods(
+        options.images,
+        profiles,
+        margin if margin is not None else 5,
+        options.coarse_width or parser_config.coarse_width,
+        options.detector or parser_config.detector,
+    )
+    for row in report:
+        logging.info(
+            row["path"] + ": " + row["method"] + " - exact " + str(row["exact"]) + " % (" + row["exact_bucket"]
+            + "), estimate " + str(row["estimate"]) + " % (" + row["estimate_bucket"] + ")"
+            + ("" if row["match"] else " MISMATCH")
+        )
+
+
+if __name__ == "__main__":
+    main()
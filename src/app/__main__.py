@@ -10,7 +10,12 @@ from facebook_scrapper import FacebookScrapper
 # image parser
 import image_utils
 import utils
-from image_parser import DancePlanningParser
+from image_parser import DancePlanningParser, DanceEvent, PARSE_OK
+import ocr_engines
+import french_dates
+import event_exporter
+from ocr_corrections import CorrectionRules
+from classification_cache import ClassificationCache
 
 # configuration
 from configuration import Config
@@ -19,6 +24,7 @@ from configuration import (
     AppParserConfig,
     AppScrapperConfig,
     MongoConfig,
+    StorageConfig,
     GoogleServiceConfig,
     MicrosoftServiceConfig,
     WhatsappServiceConfig,
@@ -26,12 +32,14 @@ from configuration import (
 from dotenv import load_dotenv
 
 # database storage
-from db import MongoDB_Python
+import db
+import async_db
 
 # calendar management / cloud calendars
 import google_services
 import msgraph_services
 from calendar_manager import CalendarManager, GoogleCalendarManager, MicrosoftCalendarManager
+from calendar_sync import CalendarSync, CalendarSyncState
 from storage_manager import StorageManager, GoogleStorageManager, MicrosoftStorageManager
 
 # notifiers
@@ -61,6 +69,7 @@ def main():
         scrapper_config = AppScrapperConfig(config_yaml)
         parser_config = AppParserConfig(config_yaml)
         mongo_conf = MongoConfig(config_yaml)
+        storage_conf = StorageConfig(config_yaml)
         microsoft_services_config = MicrosoftServiceConfig(config_yaml)
         google_services_config = GoogleServiceConfig(config_yaml)
         whatsapp_services_config = WhatsappServiceConfig(config_yaml)
@@ -86,10 +95,30 @@ def main():
 
     # image scrapper properties
     TESSERACT_EXE = r"{}".format(parser_config.executable)
+    OCR_ENGINE = parser_config.ocr_engine
+    OCR_TESSDATA = parser_config.tessdata
+    OCR_WORKERS = parser_config.ocr_workers
+    OCR_CORRECTIONS = parser_config.corrections
+    OCR_REGIONS = parser_config.ocr_regions
+    OCR_REGION_WORKERS = parser_config.ocr_region_workers
+    OCR_MIN_CONFIDENCE = parser_config.min_confidence
+    OCR_REOCR_SCALE = parser_config.reocr_scale
+    OCR_REOCR_PSM = parser_config.reocr_psm
+    EXPORT_FILE = os.path.join(FOLDER_OUTPUT, parser_config.export_file) if parser_config.export_file else None
+    EXPORT_APPEND = parser_config.export_append
+    EXPORT_FLUSH = parser_config.export_flush
     IMAGE_MATCH_TOP = parser_config.top_match
     IMAGE_MATCH_MID = parser_config.med_match
-    DETECT_LOWER_HSV = parser_config.detection_lower_hsv
-    DETECT_UPPER_HSV = parser_config.detection_upper_hsv
+    DETECT_PROFILES = parser_config.color_profiles
+    IMAGE_WORKERS = parser_config.workers
+    IMAGE_COARSE_MARGIN = parser_config.coarse_margin
+    IMAGE_COARSE_WIDTH = parser_config.coarse_width
+    IMAGE_DETECTOR = parser_config.detector
+    IMAGE_REDUCED_DECODE = parser_config.reduced_decode
+    IMAGE_CACHE_SIZE = parser_config.image_cache_size
+    CACHE_FILE = os.path.join(FOLDER_OUTPUT, parser_config.cache_file) if parser_config.cache_file else None
+    CALENDAR_SYNC_FILE = os.path.join(FOLDER_OUTPUT, app_config.calendar_sync_file)
+    CALENDAR_DELETE_MISSING = app_config.calendar_delete_missing
 
     # data storage
     MONGODB_PORT = mongo_conf.port
@@ -97,6 +126,13 @@ def main():
     MONGODB_DATABASE = mongo_conf.db_name
     MONGODB_USERNAME = mongo_conf.username
     MONGODB_PASSWORD = mongo_conf.password
+    MONGODB_POOL = mongo_conf.pool
+    STORAGE_BACKEND = storage_conf.backend
+    STORAGE_SQLITE_FILE = os.path.join(FOLDER_OUTPUT, storage_conf.sqlite_file)
+    STORAGE_RAW = storage_conf.store_raw
+    STORAGE_ASYNC = storage_conf.async_writes
+    STORAGE_RETENTION_DAYS = storage_conf.retention_days
+    STORAGE_RETENTION_MODE = storage_conf.retention_mode
 
     # Office API Services
     MS_CLIENT_ID = microsoft_services_config.client_id
@@ -130,15 +166,74 @@ def main():
     RUN_WHATSAPP_NOTIFIER = False
     FORCE_CANDIDATE = False
 
+    # define colors to search for, one named profile per planning style
+    profiles = [
+        image_utils.ColorProfile(
+            profile["name"],
+            image_utils.to_np_array(profile["lower_hsv"][0], profile["lower_hsv"][1], profile["lower_hsv"][2]),
+            image_utils.to_np_array(profile["upper_hsv"][0], profile["upper_hsv"][1], profile["upper_hsv"][2]),
+            profile["top_match"],
+            profile["med_match"],
+        )
+        for profile in DETECT_PROFILES
+    ]
+    logging.info("Detection profiles: " + ", ".join(profile.name for profile in profiles))
+
     scrapper = None
     parser = None
+    cache = ClassificationCache(CACHE_FILE) if CACHE_FILE else None
+    image_cache = image_utils.ImageCache(IMAGE_CACHE_SIZE * 1024 * 1024) if IMAGE_CACHE_SIZE else None
     images_top = {}
+    # source image (content hash) of each event, and images completely parsed in this run
+    event_sources = {}
+    parsed_sources = set()
     images_med = {}
     images_low = {}
 
+    # one storage (shared pooled client) for every stage, checked before any work is done
+    storage = None
+    if RUN_DATA_STORAGE:
+        logging.info("Connecting to database")
+        storage = db.get_storage(
+            STORAGE_BACKEND,
+            sqlite_file=STORAGE_SQLITE_FILE,
+            store_raw=STORAGE_RAW,
+            hostname=MONGODB_HOSTNAME,
+            port=MONGODB_PORT,
+            database=MONGODB_DATABASE,
+            username=MONGODB_USERNAME,
+            password=MONGODB_PASSWORD,
+            collection="event",
+            **(MONGODB_POOL if STORAGE_BACKEND == db.BACKEND_MONGODB else {}),
+        )
+        storage.health_check()
+        storage.ensure_indexes()
+        logging.info("Connected ! ")
+
+    # events are then written by a background event loop as soon as they are parsed
+    writer = None
+    if storage and STORAGE_ASYNC:
+        if STORAGE_BACKEND == db.BACKEND_MONGODB:
+            async_storage = async_db.AsyncMongoStorage(
+                hostname=MONGODB_HOSTNAME,
+                port=MONGODB_PORT,
+                database=MONGODB_DATABASE,
+                username=MONGODB_USERNAME,
+                password=MONGODB_PASSWORD,
+                collection="event",
+                store_raw=STORAGE_RAW,
+                **MONGODB_POOL,
+            )
+        else:
+            async_storage = async_db.AsyncStorageAdapter(storage)
+        writer = async_db.BackgroundWriter(async_storage)
+
     if RUN_FACEBOOK_SCRAPPER:
         # empty input/output folder
-        utils.empty_folder(FOLDER_OUTPUT)
+        keep = [CACHE_FILE, EXPORT_FILE, CALENDAR_SYNC_FILE]
+        if STORAGE_BACKEND == db.BACKEND_SQLITE:
+            keep += [STORAGE_SQLITE_FILE, STORAGE_SQLITE_FILE + "-wal", STORAGE_SQLITE_FILE + "-shm"]
+        utils.empty_folder(FOLDER_OUTPUT, keep=[path for path in keep if path])
 
         # start facebook session
         logging.info("================= SCRAPPING FB =================")
@@ -172,46 +267,91 @@ def main():
         # Define path to tessaract.exe
         path_to_tesseract = TESSERACT_EXE
 
-        # define color to search for
-        lower_hsv = image_utils.to_np_array(DETECT_LOWER_HSV[0], DETECT_LOWER_HSV[1], DETECT_LOWER_HSV[2])
-        upper_hsv = image_utils.to_np_array(DETECT_UPPER_HSV[0], DETECT_UPPER_HSV[1], DETECT_UPPER_HSV[2])
 
         # retrieve images in output_folder, identify potential candidates
         files = os.listdir(FOLDER_IMAGES_DOWNLOADED)
         logging.info("Found " + str(len(files)) + " files to analyze.")
-        for filename in files:
-            filepath = os.path.join(FOLDER_IMAGES_DOWNLOADED, filename)
-
-            if os.path.isfile(filepath):
-                # load image from file and compute match possibility
-                image = image_utils.load_image(filepath)
-                presence = image_utils.get_color_presence(image, lower_hsv, upper_hsv)
-
-                # depending on similarity process or skip files
-                # then store in folders depending on match quality
-                if presence >= IMAGE_MATCH_TOP or FORCE_CANDIDATE:
-                    logging.info(
-                        "File: " + filename + " - " + "{:.2f}".format(presence).rjust(6, " ") + " % - Candidate !"
-                    )
-                    target_path = os.path.join(FOLDER_IMAGE_MATCHED_TOP, os.path.basename(filepath))
-                    utils.move_file(filepath, target_path)
-                    images_top[target_path] = image
-
-                elif presence >= IMAGE_MATCH_MID:
-                    logging.info(
-                        "File: " + filename + " - " + "{:.2f}".format(presence).rjust(6, " ") + " % - Not Candidate !"
-                    )
-                    target_path = os.path.join(FOLDER_IMAGE_MATCHED_MED, os.path.basename(filepath))
-                    utils.move_file(filepath, target_path)
-                    images_med[target_path] = image
-
-                else:
-                    logging.info(
-                        "File: " + filename + " - " + "{:.2f}".format(presence).rjust(6, " ") + " % - Not Candidate !"
-                    )
-                    target_path = os.path.join(FOLDER_IMAGE_MATCHED_LOW, os.path.basename(filepath))
-                    utils.move_file(filepath, target_path)
-                    images_low[target_path] = image
+        filepaths = [os.path.join(FOLDER_IMAGES_DOWNLOADED, filename) for filename in files]
+        filepaths = [filepath for filepath in filepaths if os.path.isfile(filepath)]
+
+        # reuse results of images already classified with the same settings
+        cached_results = {}
+        if cache:
+            classify_settings = ClassificationCache.settings_hash(
+                {
+                    "profiles": DETECT_PROFILES,
+                    "detector": IMAGE_DETECTOR,
+                    "margin": IMAGE_COARSE_MARGIN,
+                    "coarse_width": IMAGE_COARSE_WIDTH,
+                    "reduced": IMAGE_REDUCED_DECODE,
+                }
+            )
+            for filepath in filepaths:
+                result = cache.get_classification(filepath, classify_settings)
+                if result:
+                    cached_results[filepath] = result
+            logging.info("Found " + str(len(cached_results)) + " already classified files")
+
+        # load images and compute match possibility, in parallel when several workers are configured
+        logging.info("Classifying images using " + str(IMAGE_WORKERS) + " worker(s)")
+        new_results = image_utils.classify_images(
+            [filepath for filepath in filepaths if filepath not in cached_results],
+            profiles,
+            workers=IMAGE_WORKERS,
+            margin=IMAGE_COARSE_MARGIN,
+            coarse_width=IMAGE_COARSE_WIDTH,
+            detector=IMAGE_DETECTOR,
+            reduced=IMAGE_REDUCED_DECODE,
+        )
+        if cache:
+            for result in new_results:
+                cache.put_classification(result, classify_settings)
+
+        new_results = {result.path: result for result in new_results}
+        results = [cached_results.get(filepath) or new_results[filepath] for filepath in filepaths]
+        coarse_count = sum(1 for result in results if result.method == image_utils.METHOD_COARSE)
+        logging.info("Resolved " + str(coarse_count) + "/" + str(len(results)) + " images from thumbnails")
+
+        bucket_folders = {
+            image_utils.MATCH_TOP: FOLDER_IMAGE_MATCHED_TOP,
+            image_utils.MATCH_MED: FOLDER_IMAGE_MATCHED_MED,
+            image_utils.MATCH_LOW: FOLDER_IMAGE_MATCHED_LOW,
+        }
+
+        for result in results:
+            filepath = result.path
+            filename = os.path.basename(filepath)
+            presence = "{:.2f}".format(result.presence).rjust(6, " ") + " % (" + result.profile + ")"
+            logging.debug("File: " + filename + " - presence computed using " + result.method + " method")
+            logging.debug("File: " + filename + " - profile presences: " + str(result.presences))
+
+            # depending on similarity process or skip files
+            # then store in folders depending on match quality of the winning profile
+            bucket = image_utils.MATCH_TOP if FORCE_CANDIDATE else result.bucket
+            if bucket == image_utils.MATCH_TOP:
+                logging.info("File: " + filename + " - " + presence + " - Candidate !")
+            else:
+                logging.info("File: " + filename + " - " + presence + " - Not Candidate !")
+            target_folder = bucket_folders[bucket]
+
+            # with several profiles, each one gets its own sub folder
+            if len(profiles) > 1:
+                target_folder = os.path.join(target_folder, result.profile)
+                os.makedirs(target_folder, exist_ok=True)
+
+            target_path = os.path.join(target_folder, filename)
+            utils.move_file(filepath, target_path)
+
+            # pixels are only decoded at full resolution when the image is parsed
+            handle = image_utils.ImageHandle(
+                target_path, score=result.presence, bucket=bucket, profile=result.profile, cache=image_cache
+            )
+            if bucket == image_utils.MATCH_TOP:
+                images_top[target_path] = handle
+            elif bucket == image_utils.MATCH_MED:
+                images_med[target_path] = handle
+            else:
+                images_low[target_path] = handle
 
     else:
         logging.debug("Skipped Image Processing !")
@@ -225,49 +365,123 @@ def main():
         calendar_manager = MicrosoftStorageManager(calendar_service)
 
         logging.info('Uploading low-match files')
-        calendar_manager.upload_files(list(images_low.keys()), MS_STORAGE_FOLDER_LOW)
+        calendar_manager.upload_files(list(images_low.values()), MS_STORAGE_FOLDER_LOW)
         logging.info('Uploading medium-match files')
-        calendar_manager.upload_files(list(images_med.keys()), MS_STORAGE_FOLDER_MED)
+        calendar_manager.upload_files(list(images_med.values()), MS_STORAGE_FOLDER_MED)
         logging.info('Uploading top-match files')
-        calendar_manager.upload_files(list(images_top.keys()), MS_STORAGE_FOLDER_TOP)                
+        calendar_manager.upload_files(list(images_top.values()), MS_STORAGE_FOLDER_TOP)                
 
     if RUN_IMAGE_PARSING:
         logging.info("=============== IMAGE PARSER ===================")
         logging.info("OCR image and extract data as events")
-        for path, image in images_top.items():
-            parser = DancePlanningParser(path_to_tesseract)
-            logging.info('Parsing: ' + path)
-            parser.process(image=image, path=os.path.join(FOLDER_OUTPUT, "export.csv"))
+        ocr_engine = ocr_engines.get_engine(OCR_ENGINE, TESSERACT_EXE, OCR_TESSDATA)
+        parse_settings = ClassificationCache.settings_hash(
+            dict(
+                DancePlanningParser.settings(),
+                engine=OCR_ENGINE,
+                regions=DETECT_PROFILES if OCR_REGIONS else None,
+                corrections=OCR_CORRECTIONS,
+                min_confidence=OCR_MIN_CONFIDENCE,
+                reocr=[OCR_REOCR_SCALE, OCR_REOCR_PSM] if OCR_REOCR_SCALE else None,
+            )
+        )
+        parser = DancePlanningParser(
+            TESSERACT_EXE,
+            engine=ocr_engine,
+            regions=profiles if OCR_REGIONS else None,
+            detector=IMAGE_DETECTOR,
+            region_workers=OCR_REGION_WORKERS,
+            corrections=CorrectionRules.from_config(OCR_CORRECTIONS),
+            min_confidence=OCR_MIN_CONFIDENCE,
+            reocr_scale=OCR_REOCR_SCALE,
+            reocr_psm=OCR_REOCR_PSM,
+            exporter=event_exporter.get_exporter(EXPORT_FILE, append=EXPORT_APPEND, flush_every=EXPORT_FLUSH)
+            if EXPORT_FILE
+            else None,
+        )
+
+        # reuse events of images already parsed with the same settings
+        pending = []
+        for path, handle in images_top.items():
+            cached_events = cache.get_events(path, parse_settings) if cache else None
+            if cached_events is not None:
+                logging.info('Parsed (cached): ' + path)
+                # appended exports already hold the events of images parsed by previous runs
+                events = [DanceEvent.from_json_storage(event) for event in cached_events]
+                for event in events:
+                    event_sources.setdefault(event.storage_key, handle.hash)
+                events = parser.add_events(events, export=not EXPORT_APPEND)
+                if writer:
+                    writer.submit(event.to_json_storage() for event in events)
+            else:
+                pending.append(handle)
+
+        reocr_regions = 0
+        reocr_time = 0.0
+        for result in parser.process_many(pending, workers=OCR_WORKERS):
+            path = os.fspath(result.image)
+            logging.info(
+                "Parsed: " + path + " - " + result.status + " - " + str(len(result.events)) + " event(s) in "
+                + "{:.2f}".format(result.duration) + " s"
+            )
+            if result.stats.get("reocr_regions"):
+                logging.info(
+                    "Parsed: " + path + " - " + str(result.stats["reocr_regions"]) + " line(s) re-OCR'd ("
+                    + str(result.stats["reocr_improved"]) + " improved) in "
+                    + "{:.2f}".format(result.stats["reocr_time"]) + " s"
+                )
+                reocr_regions += result.stats["reocr_regions"]
+                reocr_time += result.stats["reocr_time"]
+            if result.error is not None:
+                logging.error("Failed parsing " + path + ": " + str(result.error))
+            elif cache:
+                cache.put_events(path, parse_settings, result.events)
+            for event in result.events:
+                event_sources.setdefault(event.storage_key, result.image.hash)
+            if result.status == PARSE_OK and not result.stats.get("skipped_lines"):
+                # every line was read: events missing from this image were removed from the poster
+                parsed_sources.add(result.image.hash)
+            if writer:
+                # events shared with an earlier poster are already submitted
+                writer.submit(event.to_json_storage() for event in result.added)
+        logging.info(">> Total Events: " + str(parser.planning.count()))
+        logging.info("Re-OCR: " + str(reocr_regions) + " line(s) in " + "{:.2f}".format(reocr_time) + " s")
+        logging.info("Date parser: " + str(french_dates.default_parser.stats()))
+        logging.info("OCR corrections: " + str(parser.corrections.stats()))
+        parser.close()
+        ocr_engine.close()
+        if parser.exporter is not None:
+            parser.exporter.close()
 
     if RUN_DATA_STORAGE:
         logging.info("=============== DATA INTEGRATION ===============")
-        logging.info("Connecting to database")
-        mongo_client = MongoDB_Python(
-            hostname=MONGODB_HOSTNAME,
-            port=MONGODB_PORT,
-            database=MONGODB_DATABASE,
-            username=MONGODB_USERNAME,
-            password=MONGODB_PASSWORD,
-            collection="event",
-        )
-        if mongo_client:
-            logging.info("Connected ! ")
-
-        # insert events into database
+        # insert or update events into database, one bulk write per batch
         logging.info("Inserting events")
         try:
-            for event in parser.planning.events:
-                dict_event = event.to_json_storage()  # dict(event)
-                if not mongo_client.exists(dict_event):
-                    logging.info("Inserting: " + event.short_infos())
-                    mongo_client.create(dict_event)
-                else:
-                    logging.info("Skipping: " + event.short_infos())
+            if writer:
+                # events were written during parsing, wait for the last writes
+                counts = writer.close()
+            else:
+                counts = storage.upsert_many(event.to_json_storage() for event in parser.planning.events)
+            logging.info(
+                "Events: " + str(counts["inserted"]) + " inserted, " + str(counts["updated"]) + " updated, "
+                + str(counts["unchanged"]) + " unchanged"
+            )
         except AttributeError as e:
             logging.info("No data to integrate !")
         except Exception as e:
             raise e
 
+        if STORAGE_RETENTION_DAYS:
+            storage.apply_retention(STORAGE_RETENTION_DAYS, STORAGE_RETENTION_MODE)
+
+    # mapping of pushed events to remote ids, only changes are sent to the calendars
+    sync_state = None
+    if RUN_ONLINE_CALENDAR_GOOGLE or RUN_ONLINE_CALENDAR_MS:
+        sync_state = CalendarSyncState(CALENDAR_SYNC_FILE)
+    # deletions are opt-in, limited to events of the images parsed again in this run
+    deletable_sources = parsed_sources if CALENDAR_DELETE_MISSING else None
+
     if RUN_ONLINE_CALENDAR_GOOGLE:
         logging.info("=============== GOOGLE CALENDAR ================")
         # get google calendar service helper
@@ -276,9 +490,8 @@ def main():
         calendar_manager = GoogleCalendarManager(calendar_service)
         logging.info('Connected to calendar !')
         try:
-            for event in parser.planning.events:
-                logging.info("Adding: " + event.short_infos())
-                calendar_handler = calendar_manager.create_event(calendar_service, event)
+            calendar_sync = CalendarSync(calendar_manager, sync_state, "google", "primary")
+            calendar_sync.sync(parser.planning.events, event_sources, deletable_sources)
         except AttributeError as e:
             logging.info("No data to integrate !")
         except Exception as e:
@@ -292,9 +505,8 @@ def main():
         calendar_manager = MicrosoftCalendarManager(calendar_service)
         logging.info('Connected to calendar !')
         try:
-            for event in parser.planning.events:
-                logging.info("Adding: " + event.short_infos())
-                calendar_handler = calendar_manager.create_event(event, calendar_name="RockDancePlanning")
+            calendar_sync = CalendarSync(calendar_manager, sync_state, "microsoft", "RockDancePlanning")
+            calendar_sync.sync(parser.planning.events, event_sources, deletable_sources)
         except AttributeError as e:
             logging.info("No data to integrate !")
         except Exception as e:
@@ -309,6 +521,14 @@ def main():
         bot.send_message("TestWhatsApp", "Me !")
         bot.close_and_quit()
 
+    if cache:
+        cache.close()
+    if sync_state:
+        sync_state.close()
+    if storage:
+        storage.close()
+    db.close_mongo_clients()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# coding: utf-8
+import asyncio
+import itertools
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import ASCENDING, UpdateOne, ReplaceOne
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    AsyncIOMotorClient = None
+
+import db
+import event_query
+from event_query import EventQuery
+
+
+class AsyncJSONStorage(ABC):
+    """
+    Awaitable counterpart of db.JSONStorage.
+    """
+
+    BATCH_SIZE = db.MongoDB_Python.BATCH_SIZE
+
+    @abstractmethod
+    async def create(self, query={}):
+        pass
+
+    @abstractmethod
+    async def read(self, query={}):
+        pass
+
+    @abstractmethod
+    async def update(self, query_1={}, query_2={}):
+        pass
+
+    @abstractmethod
+    async def delete(self, query={}):
+        pass
+
+    @abstractmethod
+    async def upsert_many(self, documents, batch_size=BATCH_SIZE):
+        pass
+
+    async def ensure_indexes(self):
+        pass
+
+    async def health_check(self):
+        return True
+
+    async def close(self):
+        pass
+
+
+class AsyncMongoStorage(AsyncJSONStorage):
+    """
+    MongoDB storage on the motor asyncio driver, same documents, indexes and upsert rules as db.MongoDB_Python.
+    """
+
+    def __init__(
+        self, hostname, port, database, username, password, collection, store_raw=False, client=None, **pool
+    ):
+        if AsyncIOMotorClient is None:
+            raise ImportError("motor is not installed, see requirements-optional.txt")
+        options = {
+            "maxPoolSize": pool.get("pool_size", 10),
+            "connectTimeoutMS": pool.get("connect_timeout_ms", 5000),
+            "serverSelectionTimeoutMS": pool.get("server_selection_timeout_ms", 5000),
+            "socketTimeoutMS": pool.get("socket_timeout_ms"),
+        }
+        if pool.get("write_concern") is not None:
+            options["w"] = pool["write_concern"]
+        if pool.get("journal") is not None:
+            options["journal"] = pool["journal"]
+        if client is None:
+            client = AsyncIOMotorClient(host=hostname, port=port, username=username, password=password, **options)
+        self.conn = client
+        self.db = self.conn[database]
+        self.cursor = self.db.get_collection(collection)
+        self.store_raw = store_raw
+        self.raw_cursor = self.db.get_collection(collection + "_raw")
+
+    async def health_check(self):
+        try:
+            await self.conn.admin.command("ping")
+        except Exception as e:
+            logging.error("MongoDB is not reachable !")
+            raise e
+        return True
+
+    async def ensure_indexes(self):
+        await self.cursor.create_index(
+            [(db.KEY_FIELD, ASCENDING)],
+            unique=True,
+            name="event_key",
+            partialFilterExpression={db.KEY_FIELD: {"$exists": True}},
+        )
+        await self.cursor.create_index([(db.FINGERPRINT_FIELD, ASCENDING)], name="event_fingerprint")
+        for name, keys in event_query.INDEXES:
+            await self.cursor.create_index(keys, name=name)
+
+    async def create(self, query={}):
+        result = await self.cursor.insert_one(query)
+        logging.debug("MongoDB: Inserted event: " + str(result.inserted_id))
+
+    async def read(self, query={}):
+        return [document async for document in self.cursor.find(query)]
+
+    async def update(self, query_1={}, query_2={}):
+        await self.cursor.update_one(query_1, query_2)
+
+    async def delete(self, query={}):
+        await self.cursor.delete_many(query)
+
+    async def find_events(self, query: EventQuery):
+        mongo_filter, projection = query.to_mongo()
+        cursor = self.cursor.find(mongo_filter, projection).sort(event_query.SORT_FIELD, ASCENDING)
+        async for document in cursor.batch_size(query.page_size):
+            yield document
+
+    async def upsert_many(self, documents, batch_size=AsyncJSONStorage.BATCH_SIZE):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+
+            keys = [document[db.KEY_FIELD] for document in batch]
+            cursor = self.cursor.find(
+                {db.KEY_FIELD: {"$in": keys}}, {db.KEY_FIELD: 1, db.FINGERPRINT_FIELD: 1, "_id": 0}
+            )
+            stored = {document[db.KEY_FIELD]: document.get(db.FINGERPRINT_FIELD) async for document in cursor}
+
+            writes, raws = [], []
+            for document in batch:
+                key = document[db.KEY_FIELD]
+                if key in stored and stored[key] == document[db.FINGERPRINT_FIELD]:
+                    counts["unchanged"] += 1
+                    continue
+                document, raw = db.split_raw(document)
+                writes.append(UpdateOne({db.KEY_FIELD: key}, {"$set": document}, upsert=True))
+                if self.store_raw and raw is not None:
+                    raws.append(ReplaceOne({"_id": key}, {"_id": key, db.RAW_FIELD: raw}, upsert=True))
+            if not writes:
+                continue
+
+            try:
+                result = await self.cursor.bulk_write(writes, ordered=False)
+                upserted, matched = result.upserted_count, result.matched_count
+            except BulkWriteError as e:
+                details = e.details
+                upserted, matched = details["nUpserted"], details["nMatched"]
+                counts["errors"] += len(details["writeErrors"])
+                logging.error("MongoDB: " + str(len(details["writeErrors"])) + " event(s) not written")
+            counts["inserted"] += upserted
+            counts["updated"] += matched
+            if raws:
+                await self.raw_cursor.bulk_write(raws, ordered=False)
+
+        logging.debug("MongoDB: Upserted events: " + str(counts))
+        return counts
+
+    async def close(self):
+        self.conn.close()
+
+
+class AsyncStorageAdapter(AsyncJSONStorage):
+    """
+    Awaitable wrapper of a synchronous storage: calls run on a dedicated thread so the event loop is never blocked.
+    Closing the adapter stops its thread only, the wrapped storage stays open.
+    Wrapping db.InMemoryStorage gives a test double needing no server (see AsyncInMemoryStorage).
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        # a single thread: the wrapped storages (sqlite connections, dicts) are not thread safe
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def create(self, query={}):
+        return await self._run(self.storage.create, query)
+
+    async def read(self, query={}):
+        return await self._run(lambda: list(self.storage.read(query)))
+
+    async def update(self, query_1={}, query_2={}):
+        return await self._run(self.storage.update, query_1, query_2)
+
+    async def delete(self, query={}):
+        return await self._run(self.storage.delete, query)
+
+    async def upsert_many(self, documents, batch_size=AsyncJSONStorage.BATCH_SIZE):
+        return await self._run(self.storage.upsert_many, list(documents), batch_size)
+
+    async def ensure_indexes(self):
+        return await self._run(self.storage.ensure_indexes)
+
+    async def health_check(self):
+        return await self._run(self.storage.health_check)
+
+    async def close(self):
+        # the wrapped storage belongs to the caller, which closes it
+        self.executor.shutdown()
+
+
+class AsyncInMemoryStorage(AsyncStorageAdapter):
+    """
+    Server-less async storage, for tests and benchmarks.
+    """
+
+    def __init__(self, store_raw=False, delay=0.0):
+        super().__init__(db.InMemoryStorage(store_raw=store_raw))
+        # simulated network round trip per call
+        self.delay = delay
+
+    async def _run(self, function, *args):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return await super()._run(function, *args)
+
+    async def close(self):
+        # created here, so owned by the adapter
+        await super()._run(self.storage.close)
+        await super().close()
+
+
+class BackgroundWriter(object):
+    """
+    Runs an async storage on its own event loop thread: documents submitted from the parsing loop are upserted
+    concurrently while the next images are parsed. close() waits for every pending write and returns the counts.
+    """
+
+    def __init__(self, storage: AsyncJSONStorage, batch_size=AsyncJSONStorage.BATCH_SIZE):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="storage-writer", daemon=True)
+        self.thread.start()
+        self.futures = []
+
+    def submit(self, documents):
+        documents = list(documents)
+        if documents:
+            coroutine = self.storage.upsert_many(documents, self.batch_size)
+            self.futures.append(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    def close(self):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+        for future in self.futures:
+            for name, count in future.result().items():
+                counts[name] += count
+        asyncio.run_coroutine_threadsafe(self.storage.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        return counts
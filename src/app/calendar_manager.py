@@ -41,6 +41,27 @@ class CalendarManager(ABC):
     def get_service():
         pass
 
+    # remote id based operations, used by calendar_sync.CalendarSync
+
+    @abstractmethod
+    def remote_id(self, result):
+        # remote event id from a create_event result
+        pass
+
+    @abstractmethod
+    def update_event(self, remote_id, event: Event, calendar_name: str):
+        pass
+
+    @abstractmethod
+    def delete_remote_event(self, remote_id, calendar_name: str):
+        pass
+
+    def list_changes(self, calendar_name: str, token=None):
+        """
+        Delta query: (ids of events deleted remotely since token, new token), or None when not supported.
+        """
+        return None
+
 
 class GoogleCalendarManager(CalendarManager):
     service = None
@@ -49,25 +70,80 @@ class GoogleCalendarManager(CalendarManager):
         super().__init__(service)
         self.service = service
 
-    def create_event(self, event: Event, calendar_name : str, color):
-        event_result = self.service.events().insert(calendarId='primary',
-            body={
-                "summary": event.description,
-                "description": event.description,
-                "start": {"dateTime": event.start_date.isoformat(), "timeZone": 'Europe/Paris'},
-                "end": {"dateTime": event.end_date.isoformat(), "timeZone": 'Europe/Paris'},
-            }
+    @staticmethod
+    def event_body(event: Event):
+        return {
+            "summary": event.description,
+            "description": event.description,
+            "location": event.location or "",
+            "start": {"dateTime": event.start_date.isoformat(), "timeZone": 'Europe/Paris'},
+            "end": {"dateTime": event.end_date.isoformat(), "timeZone": 'Europe/Paris'},
+        }
+
+    @staticmethod
+    def calendar_id(calendar_name):
+        return calendar_name or 'primary'
+
+    def create_event(self, event: Event, calendar_name : str = None, color = None):
+        event_result = self.service.events().insert(
+            calendarId=self.calendar_id(calendar_name), body=self.event_body(event)
         ).execute()
         logging.debug(event_result)
 
-        return event_result     
+        return event_result
 
+    def remote_id(self, result):
+        return result["id"]
 
-    def delete_event(self, event: Event, calendar : str):
-        pass
+    def update_event(self, remote_id, event: Event, calendar_name : str = None):
+        return self.service.events().update(
+            calendarId=self.calendar_id(calendar_name), eventId=remote_id, body=self.event_body(event)
+        ).execute()
 
-    def search_event(self, event: Event, calendar : str):
-        pass
+    def delete_remote_event(self, remote_id, calendar_name : str = None):
+        try:
+            self.service.events().delete(calendarId=self.calendar_id(calendar_name), eventId=remote_id).execute()
+        except Exception as e:
+            # already deleted remotely
+            if getattr(getattr(e, "resp", None), "status", None) not in (404, 410):
+                raise e
+
+    def list_changes(self, calendar_name : str = None, token=None):
+        # incremental sync: only changes since the sync token (a full listing gives the first token)
+        deleted = []
+        page_token = None
+        while True:
+            try:
+                response = self.service.events().list(
+                    calendarId=self.calendar_id(calendar_name), syncToken=token, pageToken=page_token, showDeleted=True
+                ).execute()
+            except Exception as e:
+                # expired sync token: start over with a full listing
+                if token and getattr(getattr(e, "resp", None), "status", None) == 410:
+                    return self.list_changes(calendar_name, None)
+                raise e
+            deleted.extend(item["id"] for item in response.get("items", []) if item.get("status") == "cancelled")
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return deleted, response.get("nextSyncToken")
+
+    def search_event(self, event: Event, calendar : str = None):
+        # events with the same summary and start
+        response = self.service.events().list(
+            calendarId=self.calendar_id(calendar),
+            timeMin=event.start_date.isoformat(),
+            timeMax=(event.end_date or event.start_date).isoformat(),
+            q=event.description,
+            singleEvents=True,
+        ).execute()
+        return [
+            item for item in response.get("items", [])
+            if item.get("summary") == event.description
+        ]
+
+    def delete_event(self, event: Event, calendar : str = None):
+        for item in self.search_event(event, calendar):
+            self.delete_remote_event(item["id"], calendar)
 
     def get_calendars(self, calendar : str):
         pass
@@ -106,18 +182,51 @@ class MicrosoftCalendarManager(CalendarManager):
             if event.end_date:
                 new_event.end = event.end_date
 
-            event_result = new_event.save()
+            # save() only returns a status, the saved event carries the remote id
+            if not new_event.save():
+                raise RuntimeError('Event could not be saved !')
+            event_result = new_event
         else:
             raise RuntimeError('Event does not exist !')
 
         return event_result     
 
 
-    def delete_event(self, event: Event, calendar : str):
-        pass
+    def remote_id(self, result):
+        return result.object_id
+
+    def update_event(self, remote_id, event: Event, calendar_name : str):
+        calendar = self.service.get_calendar(calendar_name=calendar_name)
+        remote_event = calendar.get_event(remote_id)
+        if remote_event is None:
+            raise RuntimeError('Event does not exist !')
+        remote_event.subject = event.description
+        remote_event.location = event.location or ""
+        remote_event.start = event.start_date
+        if event.end_date:
+            remote_event.end = event.end_date
+        return remote_event.save()
+
+    def delete_remote_event(self, remote_id, calendar_name : str):
+        calendar = self.service.get_calendar(calendar_name=calendar_name)
+        remote_event = calendar.get_event(remote_id)
+        # already deleted remotely
+        if remote_event is not None:
+            remote_event.delete()
 
     def search_event(self, event: Event, calendar : str):
-        pass
+        # events with the same subject and start
+        remote_calendar = self.service.get_calendar(calendar_name=calendar)
+        query = remote_calendar.new_query('start').greater_equal(event.start_date)
+        query.chain('and').on_attribute('end').less_equal(event.end_date or event.start_date)
+        return [
+            remote_event for remote_event in remote_calendar.get_events(query=query, include_recurring=False)
+            if remote_event.subject == event.description
+        ]
+
+    def delete_event(self, event: Event, calendar : str):
+        for remote_event in self.search_event(event, calendar):
+            remote_event.delete()
 
     def get_calendars(self, calendar_name : str = None):
         calendar = []
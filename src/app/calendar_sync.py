@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# coding: utf-8
+import logging
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+
+from calendar_manager import CalendarManager
+
+SYNC_CREATE = "create"
+SYNC_UPDATE = "update"
+SYNC_DELETE = "delete"
+SYNC_SOURCE = "source"
+
+SyncEntry = namedtuple("SyncEntry", ["key", "fingerprint", "remote_id", "start_ts", "source"])
+SyncChange = namedtuple("SyncChange", ["action", "key", "event", "remote_id"])
+
+
+class CalendarSyncState(object):
+    """
+    Local SQLite record of what was pushed to each remote calendar: event key -> (fingerprint, remote event id,
+    source image), plus the provider delta / sync token of each calendar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS synced_events ("
+            " provider TEXT NOT NULL,"
+            " calendar TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " fingerprint TEXT,"
+            " remote_id TEXT NOT NULL,"
+            " start_ts REAL,"
+            " updated TEXT,"
+            " source TEXT,"
+            " PRIMARY KEY (provider, calendar, key))"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS synced_events_remote ON synced_events (provider, calendar, remote_id)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_tokens ("
+            " provider TEXT NOT NULL,"
+            " calendar TEXT NOT NULL,"
+            " token TEXT,"
+            " PRIMARY KEY (provider, calendar))"
+        )
+        self.conn.commit()
+
+    def entries(self, provider, calendar):
+        rows = self.conn.execute(
+            "SELECT key, fingerprint, remote_id, start_ts, source FROM synced_events"
+            " WHERE provider = ? AND calendar = ?",
+            (provider, calendar),
+        )
+        return {row[0]: SyncEntry(*row) for row in rows}
+
+    def save(self, provider, calendar, event, remote_id, source=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO synced_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                provider,
+                calendar,
+                event.storage_key,
+                event.fingerprint,
+                remote_id,
+                event.start_date.timestamp(),
+                datetime.now().isoformat(),
+                source,
+            ),
+        )
+        self.conn.commit()
+
+    def set_source(self, provider, calendar, key, source):
+        self.conn.execute(
+            "UPDATE synced_events SET source = ? WHERE provider = ? AND calendar = ? AND key = ?",
+            (source, provider, calendar, key),
+        )
+        self.conn.commit()
+
+    def forget(self, provider, calendar, key=None, remote_id=None):
+        if key is not None:
+            self.conn.execute(
+                "DELETE FROM synced_events WHERE provider = ? AND calendar = ? AND key = ?", (provider, calendar, key)
+            )
+        else:
+            self.conn.execute(
+                "DELETE FROM synced_events WHERE provider = ? AND calendar = ? AND remote_id = ?",
+                (provider, calendar, remote_id),
+            )
+        self.conn.commit()
+
+    def get_token(self, provider, calendar):
+        row = self.conn.execute(
+            "SELECT token FROM sync_tokens WHERE provider = ? AND calendar = ?", (provider, calendar)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_token(self, provider, calendar, token):
+        self.conn.execute("INSERT OR REPLACE INTO sync_tokens VALUES (?, ?, ?)", (provider, calendar, token))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class CalendarSync(object):
+    """
+    Incremental push of a planning to a remote calendar: only new events are created and events whose fingerprint
+    changed are updated. Each pushed event records its source image.
+    Deletion is opt-in: a run only holds the posters it parsed, so only events of sources given as parsed_sources
+    (images parsed again, completely, in this run) are deleted when they disappeared from their source.
+    When the provider supports delta queries, events deleted remotely are forgotten first so they are pushed again.
+    """
+
+    def __init__(self, manager: CalendarManager, state: CalendarSyncState, provider, calendar_name):
+        self.manager = manager
+        self.state = state
+        self.provider = provider
+        self.calendar_name = calendar_name
+
+    def pull_changes(self):
+        # apply remote deletions reported since the last sync token
+        token = self.state.get_token(self.provider, self.calendar_name)
+        delta = self.manager.list_changes(self.calendar_name, token)
+        if delta is None:
+            return 0
+        deleted_ids, token = delta
+        for remote_id in deleted_ids:
+            self.state.forget(self.provider, self.calendar_name, remote_id=remote_id)
+        if token:
+            self.state.set_token(self.provider, self.calendar_name, token)
+        return len(deleted_ids)
+
+    def diff(self, events, sources=None, parsed_sources=None):
+        """
+        Changes needed to bring the remote calendar in line with events.
+        sources maps event storage keys to their source image, parsed_sources enables deletions (see class).
+        """
+        sources = sources or {}
+        entries = self.state.entries(self.provider, self.calendar_name)
+        changes = []
+        planned = set()
+        for event in events:
+            key = event.storage_key
+            planned.add(key)
+            entry = entries.get(key)
+            if entry is None:
+                changes.append(SyncChange(SYNC_CREATE, key, event, None))
+            elif entry.fingerprint != event.fingerprint:
+                changes.append(SyncChange(SYNC_UPDATE, key, event, entry.remote_id))
+            elif sources.get(key) is not None and sources[key] != entry.source:
+                # unchanged event read on another poster, local record only
+                changes.append(SyncChange(SYNC_SOURCE, key, event, entry.remote_id))
+
+        if parsed_sources:
+            for key, entry in entries.items():
+                if key not in planned and entry.source in parsed_sources:
+                    changes.append(SyncChange(SYNC_DELETE, key, None, entry.remote_id))
+        return changes
+
+    def sync(self, events, sources=None, parsed_sources=None):
+        """
+        Push the changes of events to the remote calendar. Returns the number of created, updated, deleted,
+        unchanged and failed events.
+        """
+        events = list(events)
+        sources = sources or {}
+        remote_deleted = self.pull_changes()
+        changes = self.diff(events, sources, parsed_sources)
+        counts = {SYNC_CREATE: 0, SYNC_UPDATE: 0, SYNC_DELETE: 0, "unchanged": 0, "failed": 0}
+        pushed = sum(1 for change in changes if change.action in (SYNC_CREATE, SYNC_UPDATE))
+        counts["unchanged"] = len(events) - pushed
+
+        for change in changes:
+            if change.action == SYNC_SOURCE:
+                self.state.set_source(self.provider, self.calendar_name, change.key, sources[change.key])
+                continue
+            try:
+                if change.action == SYNC_CREATE:
+                    logging.info("Adding: " + change.event.short_infos())
+                    result = self.manager.create_event(change.event, self.calendar_name)
+                    remote_id = self.manager.remote_id(result)
+                    self.state.save(self.provider, self.calendar_name, change.event, remote_id, sources.get(change.key))
+                elif change.action == SYNC_UPDATE:
+                    logging.info("Updating: " + change.event.short_infos())
+                    self.manager.update_event(change.remote_id, change.event, self.calendar_name)
+                    self.state.save(
+                        self.provider, self.calendar_name, change.event, change.remote_id, sources.get(change.key)
+                    )
+                else:
+                    logging.info("Deleting: " + change.key)
+                    self.manager.delete_remote_event(change.remote_id, self.calendar_name)
+                    self.state.forget(self.provider, self.calendar_name, key=change.key)
+                counts[change.action] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                logging.error("Calendar sync " + change.action + " failed for " + change.key + ": " + str(e))
+
+        logging.info(
+            "Calendar " + self.provider + "/" + self.calendar_name + ": " + str(counts[SYNC_CREATE]) + " created, "
+            + str(counts[SYNC_UPDATE]) + " updated, " + str(counts[SYNC_DELETE]) + " deleted, "
+            + str(counts["unchanged"]) + " unchanged, " + str(counts["failed"]) + " failed ("
+            + str(remote_deleted) + " deleted remotely)"
+        )
+        return counts
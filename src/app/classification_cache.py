@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# coding: utf-8
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+import image_utils
+from image_utils import ClassificationResult
+
+
+class ClassificationCache(object):
+    """
+    Persistent SQLite cache of image classification and parsing results.
+    Entries are keyed by the content hash of the image and the hash of the settings used to compute them,
+    so results are automatically invalidated when HSV bounds, thresholds or OCR settings change.
+    Perceptual hashes allow re-encoded copies of an already processed image to be recognized: a perceptual hash
+    match is only used when the aspect ratio and the color signature of both images agree, since posters built
+    on the same template can share a grayscale hash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            " content_hash TEXT NOT NULL,"
+            " settings_hash TEXT NOT NULL,"
+            " phash TEXT,"
+            " presence REAL,"
+            " bucket TEXT,"
+            " method TEXT,"
+            " profile TEXT,"
+            " presences TEXT,"
+            " updated TEXT,"
+            " width INTEGER,"
+            " height INTEGER,"
+            " signature TEXT,"
+            " PRIMARY KEY (content_hash, settings_hash))"
+        )
+        # caches created before the perceptual hash check
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(classifications)")}
+        for column, column_type in (("width", "INTEGER"), ("height", "INTEGER"), ("signature", "TEXT")):
+            if column not in columns:
+                self.conn.execute("ALTER TABLE classifications ADD COLUMN " + column + " " + column_type)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS classifications_phash ON classifications (phash, settings_hash)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS parses ("
+            " content_hash TEXT NOT NULL,"
+            " settings_hash TEXT NOT NULL,"
+            " events TEXT,"
+            " updated TEXT,"
+            " PRIMARY KEY (content_hash, settings_hash))"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}
+
+    def content_hash(self, path):
+        # memoize file hashes as long as the file is not modified
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest = image_utils.content_hash(path)
+            self._hashes[key] = digest
+        return digest
+
+    @staticmethod
+    def settings_hash(settings):
+        # stable hash of any json serializable settings structure
+        dump = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha1(dump.encode("utf-8")).hexdigest()
+
+    def get_classification(self, path, settings_hash):
+        """
+        Return the cached ClassificationResult for an image file, or None when it was never classified
+        with these settings. The result path is replaced by the given path.
+        """
+        digest = self.content_hash(path)
+        row = self.conn.execute(
+            "SELECT presence, bucket, method, profile, presences FROM classifications"
+            " WHERE content_hash = ? AND settings_hash = ?",
+            (digest, settings_hash),
+        ).fetchone()
+
+        if row is None:
+            # same picture but different bytes (new screenshot)
+            phash = image_utils.perceptual_hash(path)
+            if phash is not None:
+                candidates = self.conn.execute(
+                    "SELECT presence, bucket, method, profile, presences, width, height, signature"
+                    " FROM classifications WHERE phash = ? AND settings_hash = ?",
+                    (phash, settings_hash),
+                ).fetchall()
+                row = self.verify_copy(path, candidates)
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        presence, bucket, method, profile, presences = row
+        return ClassificationResult(path, presence, bucket, method, profile, json.loads(presences))
+
+    @staticmethod
+    def verify_copy(path, candidates, ratio_tolerance=0.01):
+        """
+        First perceptual hash candidate which is a copy of the image at path: same aspect ratio (rescaled copies
+        are accepted) and same color signature. Returns its classification columns, or None.
+        """
+        if not candidates:
+            return None
+        width, height = image_utils.get_image_size(path)
+        signature = None
+        for candidate in candidates:
+            stored_width, stored_height, stored_signature = candidate[5:]
+            if not stored_width or not stored_height or not stored_signature:
+                # stored before the check existed, can not be verified
+                continue
+            if abs(width / height - stored_width / stored_height) > ratio_tolerance * (width / height):
+                continue
+            if signature is None:
+                signature = image_utils.color_signature(path)
+            if image_utils.same_colors(signature, json.loads(stored_signature)):
+                return candidate[:5]
+        return None
+
+    def put_classification(self, result, settings_hash):
+        width, height = image_utils.get_image_size(result.path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.content_hash(result.path),
+                settings_hash,
+                image_utils.perceptual_hash(result.path),
+                float(result.presence),
+                result.bucket,
+                result.method,
+                result.profile,
+                json.dumps({name: float(presence) for name, presence in result.presences.items()}),
+                datetime.now().isoformat(),
+                width,
+                height,
+                json.dumps(image_utils.color_signature(result.path)),
+            ),
+        )
+        self.conn.commit()
+
+    def get_events(self, path, settings_hash):
+        """
+        Return the cached parsed events (as to_json_storage dictionaries) of an image file,
+        or None when it was never parsed with these settings.
+        """
+        row = self.conn.execute(
+            "SELECT events FROM parses WHERE content_hash = ? AND settings_hash = ?",
+            (self.content_hash(path), settings_hash),
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        events = json.loads(row[0])
+        for event in events:
+            for field in ("start_date", "end_date"):
+                if event.get(field):
+                    event[field] = datetime.fromisoformat(event[field])
+        return events
+
+    def put_events(self, path, settings_hash, events):
+        rows = [event.to_json_storage() for event in events]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?)",
+            (
+                self.content_hash(path),
+                settings_hash,
+                json.dumps(rows, default=lambda value: value.isoformat()),
+                datetime.now().isoformat(),
+            ),
+        )
+        self.conn.commit()
+
+    def close(self):
+        logging.info("Cache: " + str(self.hits) + " hit(s), " + str(self.misses) + " miss(es)")
+        self.conn.close()
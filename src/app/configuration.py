@@ -40,6 +40,17 @@ class AppGlobalConfig(Config):
     def debug(self):
         return self.get_property("app.debug")
 
+    @property
+    def calendar_sync_file(self):
+        # events pushed to online calendars (sqlite file in output folder)
+        sync_file = self.get_property("app.calendars.sync-file")
+        return "calendar-sync.sqlite" if sync_file is None else sync_file
+
+    @property
+    def calendar_delete_missing(self):
+        # delete pushed events that disappeared from a poster parsed again, disabled by default
+        return bool(self.get_property("app.calendars.delete-missing"))
+
 
 class MongoConfig(Config):
     @property
@@ -62,6 +73,58 @@ class MongoConfig(Config):
     def password(self):
         return os.getenv("MONGODB_PASSWORD")
 
+    @property
+    def pool(self):
+        # options of the shared pooled client (see db.get_mongo_client)
+        def option(name, default):
+            value = self.get_property("databases.mongodb." + name)
+            return default if value is None else value
+
+        return {
+            "pool_size": int(option("pool-size", 10)),
+            "connect_timeout_ms": int(option("connect-timeout-ms", 5000)),
+            "server_selection_timeout_ms": int(option("server-selection-timeout-ms", 5000)),
+            "socket_timeout_ms": option("socket-timeout-ms", None),
+            "write_concern": option("write-concern", None),
+            "journal": option("journal", None),
+        }
+
+
+class StorageConfig(Config):
+    @property
+    def backend(self):
+        # mongodb (server), sqlite (embedded file) or memory (nothing persisted)
+        backend = self.get_property("databases.backend")
+        return "mongodb" if backend is None else str(backend)
+
+    @property
+    def sqlite_file(self):
+        # sqlite database file, relative to the output folder
+        sqlite_file = self.get_property("databases.sqlite.file")
+        return "events.sqlite" if sqlite_file is None else sqlite_file
+
+    @property
+    def retention_days(self):
+        # events starting more than this number of days ago are removed (0 = keep everything)
+        days = self.get_property("databases.retention.days")
+        return 0 if days is None else int(days)
+
+    @property
+    def retention_mode(self):
+        # ttl (server side TTL index, mongodb), purge (delete at each run) or archive (move then delete)
+        mode = self.get_property("databases.retention.mode")
+        return "purge" if mode is None else str(mode)
+
+    @property
+    def async_writes(self):
+        # write events in the background while images are still being parsed
+        return bool(self.get_property("databases.async-writes"))
+
+    @property
+    def store_raw(self):
+        # keep the raw OCR words of each event, compressed, out of the event documents
+        return bool(self.get_property("databases.store-raw"))
+
 
 class AppScrapperConfig(Config):
     @property
@@ -91,6 +154,72 @@ class AppParserConfig(Config):
     def executable(self):
         return self.get_property("app.parser.tesseract-exe")
         
+    @property
+    def ocr_engine(self):
+        # pytesseract (one process per image) or tesserocr (models kept loaded in process)
+        engine = self.get_property("app.parser.ocr-engine")
+        return "pytesseract" if engine is None else str(engine)
+
+    @property
+    def ocr_workers(self):
+        # number of images OCR'd concurrently
+        workers = self.get_property("app.parser.ocr-workers")
+        return 1 if workers is None else int(workers)
+
+    @property
+    def ocr_regions(self):
+        # only OCR the detected color bands instead of the full image
+        return bool(self.get_property("app.parser.ocr-regions"))
+
+    @property
+    def ocr_region_workers(self):
+        workers = self.get_property("app.parser.ocr-region-workers")
+        return 1 if workers is None else int(workers)
+
+    @property
+    def reocr_scale(self):
+        # upscale factor of the second OCR pass on low confidence lines (0 = disabled)
+        scale = self.get_property("app.parser.reocr-scale")
+        return 0 if scale is None else float(scale)
+
+    @property
+    def reocr_psm(self):
+        # tesseract page segmentation mode of the second pass (7 = single text line)
+        psm = self.get_property("app.parser.reocr-psm")
+        return 7 if psm is None else int(psm)
+
+    @property
+    def min_confidence(self):
+        # words below this confidence flag their line (and trigger the second pass)
+        confidence = self.get_property("app.parser.min-confidence")
+        return 60 if confidence is None else float(confidence)
+
+    @property
+    def export_file(self):
+        # events export file in output folder (.csv, .ndjson or .parquet folder), remove to disable
+        return self.get_property("app.parser.export-file")
+
+    @property
+    def export_append(self):
+        # keep events exported by previous runs
+        append = self.get_property("app.parser.export-append")
+        return True if append is None else bool(append)
+
+    @property
+    def export_flush(self):
+        # number of events written between two flushes
+        flush = self.get_property("app.parser.export-flush")
+        return 100 if flush is None else int(flush)
+
+    @property
+    def corrections(self):
+        # OCR correction rules by field type (date, time, description)
+        return self.get_property("app.parser.corrections")
+
+    @property
+    def tessdata(self):
+        return self.get_property("app.parser.tessdata")
+
     @property
     def output_folder(self):
         return self.get_property("app.folders.output")
@@ -119,6 +248,44 @@ class AppParserConfig(Config):
     def med_match(self):
         return self.get_property("app.parser.match-med-threshold")
 
+    @property
+    def workers(self):
+        workers = self.get_property("app.parser.workers")
+        return 1 if workers is None else int(workers)
+
+    @property
+    def cache_file(self):
+        # sqlite cache file name in the output folder, disabled when not set
+        return self.get_property("app.parser.cache-file")
+
+    @property
+    def coarse_margin(self):
+        # margin around thresholds (in %) within which the exact presence is computed, None disables estimation
+        margin = self.get_property("app.parser.coarse-margin")
+        return None if margin is None else float(margin)
+
+    @property
+    def coarse_width(self):
+        width = self.get_property("app.parser.coarse-width")
+        return 250 if width is None else int(width)
+
+    @property
+    def reduced_decode(self):
+        # decode images at reduced resolution during classification
+        return bool(self.get_property("app.parser.reduced-decode"))
+
+    @property
+    def image_cache_size(self):
+        # memory budget (MB) of decoded images kept in memory, 0 disables caching
+        size = self.get_property("app.parser.image-cache-mb")
+        return 0 if size is None else int(size)
+
+    @property
+    def detector(self):
+        # color mask detector: "hsv" (cvtColor + inRange) or "lut" (precomputed BGR lookup table)
+        detector = self.get_property("app.parser.detector")
+        return "hsv" if detector is None else str(detector)
+
     @property
     def detection_lower_hsv(self):
         hsv = self.get_property("app.parser.detection-lower-color-hsv")
@@ -129,6 +296,42 @@ class AppParserConfig(Config):
         hsv = self.get_property("app.parser.detection-upper-color-hsv")
         return [hsv[0], hsv[1], hsv[2]]
 
+    @property
+    def color_profiles(self):
+        """
+        Named color detection profiles, each with its own HSV range and thresholds.
+        Profiles default to the global range and thresholds when omitted, and when no profile is
+        configured a single "planning" profile is built from the global detection settings.
+        """
+        profiles = self.get_property("app.parser.profiles")
+        if not profiles:
+            return [
+                {
+                    "name": "planning",
+                    "lower_hsv": self.detection_lower_hsv,
+                    "upper_hsv": self.detection_upper_hsv,
+                    "top_match": self.top_match,
+                    "med_match": self.med_match,
+                }
+            ]
+
+        result = []
+        for profile in profiles:
+            lower_hsv = profile.get("detection-lower-color-hsv") or self.detection_lower_hsv
+            upper_hsv = profile.get("detection-upper-color-hsv") or self.detection_upper_hsv
+            top_match = profile.get("match-top-threshold")
+            med_match = profile.get("match-med-threshold")
+            result.append(
+                {
+                    "name": profile["name"],
+                    "lower_hsv": [lower_hsv[0], lower_hsv[1], lower_hsv[2]],
+                    "upper_hsv": [upper_hsv[0], upper_hsv[1], upper_hsv[2]],
+                    "top_match": self.top_match if top_match is None else top_match,
+                    "med_match": self.med_match if med_match is None else med_match,
+                }
+            )
+        return result
+
 
 class MicrosoftServiceConfig(Config):
     
@@ -1,9 +1,109 @@
 #!/usr/bin/python
 # coding: utf-8
 
-from pymongo import MongoClient
+import itertools
+import json
 import logging
+import sqlite3
+import threading
+import uuid
+import zlib
 from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+try:
+    from pymongo import MongoClient, ASCENDING, UpdateOne, ReplaceOne
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    MongoClient = None
+    ASCENDING = 1
+
+import event_query
+from event_query import EventQuery
+
+BACKEND_MONGODB = "mongodb"
+BACKEND_SQLITE = "sqlite"
+BACKEND_MEMORY = "memory"
+
+RETENTION_TTL = "ttl"
+RETENTION_PURGE = "purge"
+RETENTION_ARCHIVE = "archive"
+
+KEY_FIELD = "key"
+FINGERPRINT_FIELD = "fingerprint"
+RAW_FIELD = "raw"
+DATE_FIELDS = ("start_date", "end_date")
+
+
+# one pooled MongoClient per connection settings and per process, shared by every MongoDB_Python
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_mongo_client(
+    hostname,
+    port,
+    username=None,
+    password=None,
+    pool_size=10,
+    connect_timeout_ms=5000,
+    server_selection_timeout_ms=5000,
+    socket_timeout_ms=None,
+    write_concern=None,
+    journal=None,
+):
+    """
+    Shared pooled MongoClient. Clients are created once for given settings and reused until close_mongo_clients().
+    """
+    if MongoClient is None:
+        raise ImportError("pymongo is not installed, see requirements-optional.txt")
+    options = {
+        "maxPoolSize": pool_size,
+        "connectTimeoutMS": connect_timeout_ms,
+        "serverSelectionTimeoutMS": server_selection_timeout_ms,
+        "socketTimeoutMS": socket_timeout_ms,
+    }
+    if write_concern is not None:
+        options["w"] = write_concern
+    if journal is not None:
+        options["journal"] = journal
+    settings = (hostname, port, username, tuple(sorted(options.items())))
+    with _clients_lock:
+        client = _clients.get(settings)
+        if client is None:
+            client = MongoClient(host=hostname, port=port, username=username, password=password, **options)
+            _clients[settings] = client
+    return client
+
+
+def close_mongo_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def retention_limit(days, now=None):
+    # events starting before this date are out of the retention period
+    return (now or datetime.now(timezone.utc)) - timedelta(days=days)
+
+
+def split_raw(document):
+    """
+    Split a document into the hot event document (without raw OCR payload) and the zlib compressed raw payload,
+    None when there is no payload.
+    """
+    document = dict(document)
+    raw = document.pop(RAW_FIELD, None)
+    if raw is None or raw == "null":
+        return document, None
+    if not isinstance(raw, str):
+        raw = json.dumps(raw)
+    return document, zlib.compress(raw.encode("utf-8"))
+
+
+def decompress_raw(data):
+    return json.loads(zlib.decompress(data).decode("utf-8")) if data is not None else None
 
 
 class JSONStorage(ABC):
@@ -29,25 +129,44 @@ class JSONStorage(ABC):
 class MongoDB_Python(JSONStorage):
     """
     """
-    def __init__(self, hostname, port, database, username, password, collection):
+    # unique canonical event key (see Event.storage_key) and content fingerprint (see Event.fingerprint)
+    KEY_FIELD = KEY_FIELD
+    FINGERPRINT_FIELD = FINGERPRINT_FIELD
+    BATCH_SIZE = 1000
+
+    def __init__(
+        self, hostname, port, database, username, password, collection, store_raw=False, client=None, **pool
+    ):
+        # pool: get_mongo_client options (pool size, timeouts, write concern)
         try:
-            # Initialize the connection on the data base.
-            self.conn = MongoClient(host=hostname, port=port, username=username, password=password)
+            # Initialize the connection on the data base, through the shared client.
+            self.conn = client if client is not None else get_mongo_client(hostname, port, username, password, **pool)
             self.db = self.conn[database]
             self.cursor = self.db.get_collection(collection)
+            # compressed raw OCR payloads, out of the event documents
+            self.store_raw = store_raw
+            self.raw_cursor = self.db.get_collection(collection + "_raw")
         except Exception as e:
             logging.error("Failed to connect to MongoDB !")
             raise e
 
+    def health_check(self):
+        # fail fast: the ping fails within the server selection timeout when the server is not reachable
+        try:
+            self.conn.admin.command("ping")
+        except Exception as e:
+            logging.error("MongoDB is not reachable !")
+            raise e
+        return True
+
     def create(self, query={}):
         # Insert a new register.
         id = self.cursor.insert_one(query)
         logging.debug('MongoDB: Inserted event: ' + str(id.inserted_id))
 
     def read(self, query={}):
-        # Read all the register.
-        for value in self.cursor.find(query):
-            print(value)
+        # Read all the matching documents, as a generator.
+        yield from self.cursor.find(query)
 
     def exists(self, query={}):
         # Read all the register.
@@ -55,17 +174,576 @@ class MongoDB_Python(JSONStorage):
         return not id is None
             
     def update(self, query_1={}, query_2={}):
-        # Change the first item on the list.
-        id = self.cursor.update(query_1, query_2)
-        logging.debug('MongoDB: Inserted event: ' + str(id.inserted_id))
+        # Change the first matching document, query_2 is either an update ($set...) or a replacement document.
+        if any(field.startswith("$") for field in query_2):
+            result = self.cursor.update_one(query_1, query_2)
+        else:
+            result = self.cursor.replace_one(query_1, query_2)
+        logging.debug("MongoDB: Updated events: " + str(result.modified_count))
 
-    def delete(self):
-        # Delete all the elements on the list.
-        for i in self.cursor.find():
-            id = self.cursor.remove(i)
-            logging.debug('MongoDB: Deleted event: ' + str(id.inserted_id))
+    def delete(self, query={}):
+        # Delete all the matching documents (all of them by default), server side.
+        return self.delete_many(query)
+
+    def update_many(self, query={}, update={}):
+        """
+        Apply an update ($set, $unset...) to every matching document in a single server side operation.
+        Returns the number of modified documents.
+        """
+        result = self.cursor.update_many(query, update)
+        logging.debug("MongoDB: Updated events: " + str(result.modified_count))
+        return result.modified_count
+
+    def delete_many(self, query={}):
+        """
+        Delete every matching document (and its raw OCR payload) server side. Returns the number of deleted events.
+        """
+        if self.store_raw:
+            keys = self.cursor.distinct(self.KEY_FIELD, query)
+            self.raw_cursor.delete_many({"_id": {"$in": keys}})
+        result = self.cursor.delete_many(query)
+        logging.debug("MongoDB: Deleted events: " + str(result.deleted_count))
+        return result.deleted_count
+
+    def ensure_ttl_index(self, days):
+        # events are removed by the server TTL monitor once their start date is older than days
+        seconds = int(days * 86400)
+        index = self.cursor.index_information().get("event_ttl")
+        if index is None:
+            self.cursor.create_index(
+                [(event_query.SORT_FIELD, ASCENDING)], name="event_ttl", expireAfterSeconds=seconds
+            )
+        elif index.get("expireAfterSeconds") != seconds:
+            # create_index with other options raises IndexOptionsConflict: change the delay in place
+            self.db.command(
+                "collMod", self.cursor.name, index={"name": "event_ttl", "expireAfterSeconds": seconds}
+            )
+            logging.info("MongoDB: TTL set to " + str(days) + " days")
+
+    def apply_retention(self, days, mode=RETENTION_PURGE):
+        """
+        Keep only events of the last days: ttl hands the purge over to the server, purge deletes older events
+        now and archive moves them to the <collection>_archive collection first. Returns the number of removed events.
+        """
+        if mode == RETENTION_TTL:
+            self.ensure_ttl_index(days)
+            return 0
+
+        query = {event_query.SORT_FIELD: {"$lt": retention_limit(days)}}
+        if mode == RETENTION_ARCHIVE:
+            archive = self.cursor.name + "_archive"
+            self.cursor.aggregate(
+                [{"$match": query}, {"$merge": {"into": archive, "on": "_id", "whenMatched": "replace"}}]
+            )
+        removed = self.delete_many(query)
+        logging.info("MongoDB: " + str(removed) + " event(s) older than " + str(days) + " days removed (" + mode + ")")
+        return removed
+
+    def ensure_indexes(self):
+        # unique index on the event key: upserts are index lookups and duplicates are rejected
+        # (documents stored before keys existed are left out of the index)
+        self.cursor.create_index(
+            [(self.KEY_FIELD, ASCENDING)],
+            unique=True,
+            name="event_key",
+            partialFilterExpression={self.KEY_FIELD: {"$exists": True}},
+        )
+        self.cursor.create_index([(self.FINGERPRINT_FIELD, ASCENDING)], name="event_fingerprint")
+        for name, keys in event_query.INDEXES:
+            self.cursor.create_index(keys, name=name)
+
+    def find_fingerprints(self, keys):
+        # stored fingerprint of each known key
+        cursor = self.cursor.find(
+            {self.KEY_FIELD: {"$in": list(keys)}}, {self.KEY_FIELD: 1, self.FINGERPRINT_FIELD: 1, "_id": 0}
+        )
+        return {document[self.KEY_FIELD]: document.get(self.FINGERPRINT_FIELD) for document in cursor}
+
+    def get_raw(self, key):
+        document = self.raw_cursor.find_one({"_id": key})
+        return decompress_raw(document[RAW_FIELD]) if document else None
+
+    def find_events(self, query: EventQuery):
+        """
+        Documents matching an EventQuery ordered by start date, fetched lazily in batches of query.page_size.
+        """
+        mongo_filter, projection = query.to_mongo()
+        cursor = self.cursor.find(mongo_filter, projection).sort(event_query.SORT_FIELD, ASCENDING)
+        yield from cursor.batch_size(query.page_size)
+
+    def find_page(self, query: EventQuery, page=0):
+        # one page (0 based) of query.page_size documents
+        mongo_filter, projection = query.to_mongo()
+        cursor = self.cursor.find(mongo_filter, projection).sort(event_query.SORT_FIELD, ASCENDING)
+        return list(cursor.skip(page * query.page_size).limit(query.page_size))
+
+    def count_events(self, query: EventQuery):
+        return self.cursor.count_documents(query.to_mongo()[0])
+
+    def upsert_many(self, documents, batch_size=BATCH_SIZE):
+        """
+        Insert or update documents by their event key, in unordered bulk_write batches.
+        Only documents whose fingerprint differs from the stored one are written, raw OCR payloads go to the
+        side collection when enabled. Returns the number of inserted, updated and unchanged documents
+        (and failed writes).
+        """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+        batch = []
+
+        def flush():
+            stored = self.find_fingerprints(document[self.KEY_FIELD] for document in batch)
+            writes, raws = [], []
+            for document in batch:
+                key = document[self.KEY_FIELD]
+                if key in stored and stored[key] == document[self.FINGERPRINT_FIELD]:
+                    counts["unchanged"] += 1
+                    continue
+                document, raw = split_raw(document)
+                writes.append(UpdateOne({self.KEY_FIELD: key}, {"$set": document}, upsert=True))
+                if self.store_raw and raw is not None:
+                    raws.append(ReplaceOne({"_id": key}, {"_id": key, RAW_FIELD: raw}, upsert=True))
+            batch.clear()
+            if not writes:
+                return
+
+            try:
+                result = self.cursor.bulk_write(writes, ordered=False)
+                upserted, matched = result.upserted_count, result.matched_count
+            except BulkWriteError as e:
+                details = e.details
+                upserted, matched = details["nUpserted"], details["nMatched"]
+                counts["errors"] += len(details["writeErrors"])
+                logging.error("MongoDB: " + str(len(details["writeErrors"])) + " event(s) not written")
+            counts["inserted"] += upserted
+            counts["updated"] += matched
+            if raws:
+                self.raw_cursor.bulk_write(raws, ordered=False)
+
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        logging.debug("MongoDB: Upserted events: " + str(counts))
+        return counts
+
+    def close(self):
+        # the pooled client is shared with other stages, it is closed by close_mongo_clients()
+        pass
 
     def list_databases(self):
         # List all databases
         for db in self.conn.list_databases():
             print(db)
+
+
+def match_document(document, query):
+    # equality match on top level fields, enough for the create / read / exists / update / delete interface
+    return all(document.get(field) == value for field, value in query.items())
+
+
+def encode_document(document):
+    return json.dumps(document, sort_keys=True, ensure_ascii=False, default=lambda value: value.isoformat())
+
+
+def decode_document(text):
+    document = json.loads(text)
+    for field in DATE_FIELDS:
+        if document.get(field):
+            document[field] = datetime.fromisoformat(document[field])
+    return document
+
+
+def apply_update(document, update):
+    # mongo like update: $set merges fields, anything else replaces the document
+    if "$set" in update:
+        updated = dict(document)
+        updated.update(update["$set"])
+        return updated
+    return dict(update)
+
+
+class LocalStorage(JSONStorage):
+    """
+    Common query and pagination helpers of the embedded backends, on top of find_events.
+    """
+    KEY_FIELD = KEY_FIELD
+    FINGERPRINT_FIELD = FINGERPRINT_FIELD
+    BATCH_SIZE = 1000
+
+    def ensure_indexes(self):
+        pass
+
+    def health_check(self):
+        return True
+
+    @abstractmethod
+    def find_fingerprints(self, keys):
+        pass
+
+    def changes(self, documents):
+        """
+        Split a batch into (document, compressed raw, already stored) tuples for new or changed documents,
+        and the number of unchanged documents, comparing fingerprints only.
+        """
+        stored = self.find_fingerprints([document[self.KEY_FIELD] for document in documents])
+        changed = []
+        unchanged = 0
+        for document in documents:
+            key = document[self.KEY_FIELD]
+            if key in stored and stored[key] == document[self.FINGERPRINT_FIELD]:
+                unchanged += 1
+                continue
+            document, raw = split_raw(document)
+            changed.append((document, raw if self.store_raw else None, key in stored))
+            # a key repeated in the batch is known from now on
+            stored[key] = document[self.FINGERPRINT_FIELD]
+        return changed, unchanged
+
+    @abstractmethod
+    def find_events(self, query: EventQuery):
+        pass
+
+    @abstractmethod
+    def update_many(self, query={}, update={}):
+        pass
+
+    @abstractmethod
+    def delete_many(self, query={}):
+        pass
+
+    @abstractmethod
+    def archive_before(self, limit):
+        pass
+
+    @abstractmethod
+    def delete_before(self, limit):
+        pass
+
+    def apply_retention(self, days, mode=RETENTION_PURGE):
+        """
+        Keep only events of the last days. Embedded backends have no TTL monitor: ttl purges like purge,
+        archive moves older events to an archive first. Returns the number of removed events.
+        """
+        limit = retention_limit(days)
+        if mode == RETENTION_ARCHIVE:
+            self.archive_before(limit)
+        removed = self.delete_before(limit)
+        logging.info("Storage: " + str(removed) + " event(s) older than " + str(days) + " days removed (" + mode + ")")
+        return removed
+
+    def find_page(self, query: EventQuery, page=0):
+        start = page * query.page_size
+        return list(itertools.islice(self.find_events(query), start, start + query.page_size))
+
+    def count_events(self, query: EventQuery):
+        return sum(1 for _ in self.find_events(query))
+
+    def close(self):
+        pass
+
+
+class InMemoryStorage(LocalStorage):
+    """
+    Dictionary backed storage: no server and no file, for tests, benchmarks and dry runs.
+    Documents are indexed by their event key.
+    """
+
+    def __init__(self, store_raw=False):
+        self.documents = {}
+        self.store_raw = store_raw
+        self.raws = {}
+        self.archive = {}
+
+    def create(self, query={}):
+        document = dict(query)
+        self.documents[document.get(self.KEY_FIELD) or uuid.uuid4().hex] = document
+        logging.debug("Memory: Inserted event: " + str(document.get(self.KEY_FIELD)))
+
+    def read(self, query={}):
+        if self.KEY_FIELD in query:
+            document = self.documents.get(query[self.KEY_FIELD])
+            documents = [document] if document is not None else []
+        else:
+            documents = list(self.documents.values())
+        yield from (document for document in documents if match_document(document, query))
+
+    def exists(self, query={}):
+        return next(self.read(query), None) is not None
+
+    def update(self, query_1={}, query_2={}):
+        # Change the first matching document.
+        for key, document in self.documents.items():
+            if match_document(document, query_1):
+                self.documents[key] = apply_update(document, query_2)
+                logging.debug("Memory: Updated event: " + str(key))
+                return
+
+    def delete(self, query={}):
+        # Delete all the matching documents (all of them by default).
+        return self.delete_many(query)
+
+    def update_many(self, query={}, update={}):
+        modified = 0
+        for key, document in self.documents.items():
+            if match_document(document, query):
+                updated = apply_update(document, update)
+                modified += updated != document
+                self.documents[key] = updated
+        return modified
+
+    def delete_many(self, query={}):
+        return self._remove([key for key, document in self.documents.items() if match_document(document, query)])
+
+    def _remove(self, keys):
+        for key in keys:
+            del self.documents[key]
+            self.raws.pop(key, None)
+        return len(keys)
+
+    def _before(self, limit):
+        return [key for key, document in self.documents.items() if document["start_date"] < limit]
+
+    def archive_before(self, limit):
+        self.archive.update((key, self.documents[key]) for key in self._before(limit))
+
+    def delete_before(self, limit):
+        return self._remove(self._before(limit))
+
+    def find_fingerprints(self, keys):
+        documents = (self.documents.get(key) for key in keys)
+        return {
+            document[self.KEY_FIELD]: document.get(self.FINGERPRINT_FIELD) for document in documents if document
+        }
+
+    def get_raw(self, key):
+        return decompress_raw(self.raws.get(key))
+
+    def upsert_many(self, documents, batch_size=LocalStorage.BATCH_SIZE):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+            changed, unchanged = self.changes(batch)
+            counts["unchanged"] += unchanged
+            for document, raw, stored in changed:
+                key = document[self.KEY_FIELD]
+                self.documents[key] = apply_update(self.documents[key], {"$set": document}) if stored else document
+                counts["updated" if stored else "inserted"] += 1
+                if raw is not None:
+                    self.raws[key] = raw
+        logging.debug("Memory: Upserted events: " + str(counts))
+        return counts
+
+    def find_events(self, query: EventQuery):
+        documents = [document for document in self.documents.values() if query.matches(document)]
+        documents.sort(key=lambda document: document["start_date"].timestamp())
+        yield from (query.project(document) for document in documents)
+
+
+class SQLiteStorage(LocalStorage):
+    """
+    Embedded SQLite storage in WAL mode. Documents are stored as JSON, keyed by their event key, with indexed
+    fingerprint and start timestamp columns. Bulk writes run in one transaction per batch, raw OCR payloads
+    are kept compressed in a side table when enabled.
+    """
+
+    def __init__(self, path, store_raw=False):
+        self.path = path
+        self.store_raw = store_raw
+        # may be driven from a writer thread (async_db.AsyncStorageAdapter), one thread at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " key TEXT PRIMARY KEY,"
+            " start_ts REAL,"
+            " document TEXT NOT NULL,"
+            " fingerprint TEXT)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(events)")]
+        if "fingerprint" not in columns:
+            self.conn.execute("ALTER TABLE events ADD COLUMN fingerprint TEXT")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS events_raw (key TEXT PRIMARY KEY, raw BLOB)")
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        self.conn.execute("CREATE INDEX IF NOT EXISTS events_start ON events (start_ts)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS events_fingerprint ON events (fingerprint)")
+        self.conn.commit()
+
+    def row(self, key, document):
+        start_date = document.get("start_date")
+        start_ts = start_date.timestamp() if start_date is not None else None
+        return (key, start_ts, encode_document(document), document.get(self.FINGERPRINT_FIELD))
+
+    def _rows(self, query):
+        if self.KEY_FIELD in query:
+            return self.conn.execute("SELECT key, document FROM events WHERE key = ?", (query[self.KEY_FIELD],))
+        if self.FINGERPRINT_FIELD in query:
+            return self.conn.execute(
+                "SELECT key, document FROM events WHERE fingerprint = ?", (query[self.FINGERPRINT_FIELD],)
+            )
+        return self.conn.execute("SELECT key, document FROM events")
+
+    def _select(self, sql, keys):
+        # run a "... WHERE key IN (?)" select by chunks, staying below the sqlite host parameter limit
+        rows = []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            rows.extend(self.conn.execute(sql.replace("?", ",".join("?" * len(chunk))), chunk))
+        return rows
+
+    def create(self, query={}):
+        key = query.get(self.KEY_FIELD) or uuid.uuid4().hex
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", self.row(key, query))
+        logging.debug("SQLite: Inserted event: " + key)
+
+    def read(self, query={}):
+        for key, text in self._rows(query):
+            document = decode_document(text)
+            if match_document(document, query):
+                yield document
+
+    def exists(self, query={}):
+        return next(self.read(query), None) is not None
+
+    def update(self, query_1={}, query_2={}):
+        # Change the first matching document.
+        for key, text in self._rows(query_1).fetchall():
+            document = decode_document(text)
+            if match_document(document, query_1):
+                row = self.row(key, apply_update(document, query_2))
+                with self.conn:
+                    self.conn.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", row)
+                logging.debug("SQLite: Updated event: " + key)
+                return
+
+    def delete(self, query={}):
+        # Delete all the matching documents (all of them by default).
+        return self.delete_many(query)
+
+    def update_many(self, query={}, update={}):
+        rows = []
+        for key, text in self._rows(query).fetchall():
+            document = decode_document(text)
+            if match_document(document, query):
+                updated = apply_update(document, update)
+                if updated != document:
+                    rows.append(self.row(key, updated))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def delete_many(self, query={}):
+        if not query:
+            with self.conn:
+                deleted = self.conn.execute("DELETE FROM events").rowcount
+                self.conn.execute("DELETE FROM events_raw")
+            return deleted
+        keys = [(key,) for key, text in self._rows(query).fetchall() if match_document(decode_document(text), query)]
+        with self.conn:
+            self.conn.executemany("DELETE FROM events WHERE key = ?", keys)
+            self.conn.executemany("DELETE FROM events_raw WHERE key = ?", keys)
+        return len(keys)
+
+    def archive_before(self, limit):
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events_archive ("
+                " key TEXT PRIMARY KEY,"
+                " start_ts REAL,"
+                " document TEXT NOT NULL,"
+                " fingerprint TEXT)"
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO events_archive SELECT * FROM events WHERE start_ts < ?", (limit.timestamp(),)
+            )
+
+    def delete_before(self, limit):
+        # runs on the start_ts index, raw payloads of the removed events go with them
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM events_raw WHERE key IN (SELECT key FROM events WHERE start_ts < ?)", (limit.timestamp(),)
+            )
+            return self.conn.execute("DELETE FROM events WHERE start_ts < ?", (limit.timestamp(),)).rowcount
+
+    def find_fingerprints(self, keys):
+        return dict(self._select("SELECT key, fingerprint FROM events WHERE key IN (?)", list(keys)))
+
+    def get_raw(self, key):
+        row = self.conn.execute("SELECT raw FROM events_raw WHERE key = ?", (key,)).fetchone()
+        return decompress_raw(row[0]) if row else None
+
+    def upsert_many(self, documents, batch_size=LocalStorage.BATCH_SIZE):
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": 0}
+        documents = iter(documents)
+        while True:
+            batch = list(itertools.islice(documents, batch_size))
+            if not batch:
+                break
+            changed, unchanged = self.changes(batch)
+            counts["unchanged"] += unchanged
+
+            # changed documents are merged into the stored ones, like a mongo $set
+            updated_keys = [document[self.KEY_FIELD] for document, raw, stored in changed if stored]
+            existing = dict(self._select("SELECT key, document FROM events WHERE key IN (?)", updated_keys))
+            writes, raws = [], []
+            for document, raw, stored in changed:
+                key = document[self.KEY_FIELD]
+                if stored:
+                    document = apply_update(decode_document(existing[key]), {"$set": document})
+                    existing[key] = encode_document(document)
+                counts["updated" if stored else "inserted"] += 1
+                writes.append(self.row(key, document))
+                if raw is not None:
+                    raws.append((key, raw))
+
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?)", writes)
+                self.conn.executemany("INSERT OR REPLACE INTO events_raw VALUES (?, ?)", raws)
+
+        logging.debug("SQLite: Upserted events: " + str(counts))
+        return counts
+
+    def find_events(self, query: EventQuery):
+        # the date range runs on the start_ts index, other filters are evaluated on the documents
+        sql = "SELECT document FROM events"
+        conditions, parameters = [], []
+        if query.start is not None:
+            conditions.append("start_ts >= ?")
+            parameters.append(query.start.timestamp())
+        if query.end is not None:
+            conditions.append("start_ts < ?")
+            parameters.append(query.end.timestamp())
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        cursor = self.conn.execute(sql + " ORDER BY start_ts", parameters)
+        while True:
+            rows = cursor.fetchmany(query.page_size)
+            if not rows:
+                break
+            for (text,) in rows:
+                document = decode_document(text)
+                if query.matches(document):
+                    yield query.project(document)
+
+    def close(self):
+        self.conn.close()
+
+
+def get_storage(backend, sqlite_file=None, store_raw=False, **mongo):
+    """
+    Build the configured event storage: mongodb (mongo holds the MongoDB_Python arguments), sqlite or memory.
+    """
+    if backend == BACKEND_SQLITE:
+        return SQLiteStorage(sqlite_file, store_raw=store_raw)
+    if backend == BACKEND_MEMORY:
+        return InMemoryStorage(store_raw=store_raw)
+    return MongoDB_Python(store_raw=store_raw, **mongo)
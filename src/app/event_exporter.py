@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# coding: utf-8
+import csv
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import image_parser
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+FORMAT_PARQUET = "parquet"
+
+EXTENSIONS = {
+    ".csv": FORMAT_CSV,
+    ".ndjson": FORMAT_NDJSON,
+    ".jsonl": FORMAT_NDJSON,
+    ".parquet": FORMAT_PARQUET,
+}
+
+# display columns, as given by dict(event)
+CSV_FIELDS = ["day", "start_date", "end_date", "hours", "description", "location", "dances"]
+# machine readable columns, dates as ISO 8601
+DATA_FIELDS = ["day", "start_date", "end_date", "description", "location", "dances"]
+
+
+def to_row(event):
+    row = {
+        "day": event.day,
+        "start_date": event.start_date.isoformat(),
+        "end_date": event.end_date.isoformat() if event.end_date is not None else None,
+        "description": event.description,
+        "location": event.location,
+        "dances": list(event.dances or []),
+    }
+    return row
+
+
+class EventExporter(ABC):
+    """
+    Incremental event writer: events are written as they are produced and flushed to disk every
+    flush_every events, so the whole planning never has to be kept in memory.
+    In append mode, events are added to the output of previous runs.
+    """
+
+    def __init__(self, path, append=True, flush_every=100):
+        self.path = path
+        self.append = append
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self.pending = 0
+
+    def write(self, events):
+        for event in events:
+            self.write_event(event)
+            self.count += 1
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.flush()
+        return self
+
+    @abstractmethod
+    def write_event(self, event):
+        pass
+
+    def flush(self):
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        logging.info("Exported " + str(self.count) + " event(s) to " + self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvEventExporter(EventExporter):
+    """
+    Excel friendly CSV (BOM, CSVStandardDialect), one line per event with the display fields.
+    The header is only written when the file is created.
+    """
+
+    def __init__(self, path, append=True, flush_every=100):
+        super().__init__(path, append, flush_every)
+        exists = append and os.path.isfile(path) and os.path.getsize(path) > 0
+        self.file = open(path, "a" if exists else "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, dialect=image_parser.CSVStandardDialect)
+        if not exists:
+            self.file.write("\ufeff")
+            self.writer.writerow(CSV_FIELDS)
+
+    def write_event(self, event):
+        row = dict(event)
+        row["dances"] = ", ".join(row["dances"] or [])
+        self.writer.writerow([row[field] for field in CSV_FIELDS])
+
+    def flush(self):
+        self.file.flush()
+        super().flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class NdjsonEventExporter(EventExporter):
+    """
+    Newline delimited JSON, one object per event with ISO 8601 dates.
+    """
+
+    def __init__(self, path, append=True, flush_every=100):
+        super().__init__(path, append, flush_every)
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write_event(self, event):
+        self.file.write(json.dumps(to_row(event), ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.file.flush()
+        super().flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetEventExporter(EventExporter):
+    """
+    Columnar export based on pyarrow. Parquet files can not be appended to, so path is a dataset folder:
+    each run writes a new part file and each flush writes a row group.
+    """
+
+    def __init__(self, path, append=True, flush_every=1000):
+        if pyarrow is None:
+            raise ImportError("pyarrow is not installed, see requirements-optional.txt")
+        super().__init__(path, append, flush_every)
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for name in os.listdir(path):
+                if name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+
+        self.schema = pyarrow.schema(
+            [
+                ("day", pyarrow.string()),
+                ("start_date", pyarrow.timestamp("us", tz="UTC")),
+                ("end_date", pyarrow.timestamp("us", tz="UTC")),
+                ("description", pyarrow.string()),
+                ("location", pyarrow.string()),
+                ("dances", pyarrow.list_(pyarrow.string())),
+            ]
+        )
+        name = "part-" + datetime.now().strftime("%Y%m%d%H%M%S%f") + ".parquet"
+        self.file = os.path.join(path, name)
+        self.writer = None
+        self.columns = {field: [] for field in DATA_FIELDS}
+
+    def write_event(self, event):
+        self.columns["day"].append(event.day)
+        self.columns["start_date"].append(event.start_date)
+        self.columns["end_date"].append(event.end_date)
+        self.columns["description"].append(event.description)
+        self.columns["location"].append(event.location)
+        self.columns["dances"].append(list(event.dances or []))
+
+    def flush(self):
+        if self.columns["day"]:
+            table = pyarrow.table(self.columns, schema=self.schema)
+            if self.writer is None:
+                self.writer = pyarrow.parquet.ParquetWriter(self.file, self.schema)
+            self.writer.write_table(table)
+            self.columns = {field: [] for field in DATA_FIELDS}
+        super().flush()
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+
+
+EXPORTERS = {
+    FORMAT_CSV: CsvEventExporter,
+    FORMAT_NDJSON: NdjsonEventExporter,
+    FORMAT_PARQUET: ParquetEventExporter,
+}
+
+
+def get_exporter(path, export_format=None, append=True, flush_every=100):
+    """
+    Build the exporter of the given format, guessed from the path extension when not given.
+    """
+    if export_format is None:
+        export_format = EXTENSIONS.get(os.path.splitext(path)[1].lower(), FORMAT_CSV)
+    exporter = EXPORTERS.get(export_format)
+    if exporter is None:
+        raise ValueError("Unknown export format: " + str(export_format))
+    return exporter(path, append=append, flush_every=flush_every)
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# coding: utf-8
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+
+import french_dates
+from french_dates import WEEKDAY_NAMES, ZoneInfo
+
+SORT_FIELD = "start_date"
+
+# compound indexes serving the queries below, the date range always comes first
+INDEXES = [
+    ("start_date_day", [("start_date", 1), ("day", 1)]),
+    ("start_date_dances", [("start_date", 1), ("dances", 1)]),
+    ("start_date_location", [("start_date", 1), ("location", 1)]),
+]
+
+
+class EventQuery(object):
+    """
+    Backend independent event filter: start date range (end excluded), weekdays (0 = monday),
+    location (case insensitive substring) and dance styles (any of).
+    Stored dates are timezone aware, so are the bounds: naive bounds are rejected.
+    fields restricts the returned fields, page_size is the batch size of results and the size of a page.
+    """
+
+    def __init__(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        weekdays: Optional[Iterable[int]] = None,
+        location: Optional[str] = None,
+        dances: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        page_size: int = 100,
+    ):
+        for bound in (start, end):
+            if bound is not None and bound.tzinfo is None:
+                raise ValueError("EventQuery: naive datetime bound " + str(bound) + ", a timezone is required")
+        self.start = start
+        self.end = end
+        self.weekdays = sorted(set(weekdays)) if weekdays else None
+        self.location = location
+        self.dances = list(dances) if dances else None
+        self.fields = list(fields) if fields else None
+        self.page_size = max(1, page_size)
+
+    @classmethod
+    def weekend(cls, today: Optional[date] = None, tzinfo=None, **kwargs):
+        # events from next (or current) friday to monday morning, local time of the plannings by default
+        tzinfo = tzinfo or ZoneInfo(french_dates.TIMEZONE)
+        today = today or date.today()
+        friday = today + timedelta(days=4 - today.weekday())
+        start = datetime.combine(friday, time(0), tzinfo=tzinfo)
+        return cls(start=start, end=start + timedelta(days=3), **kwargs)
+
+    @classmethod
+    def days(cls, first: date, count: int = 1, tzinfo=None, **kwargs):
+        # events of count days from first
+        tzinfo = tzinfo or ZoneInfo(french_dates.TIMEZONE)
+        start = datetime.combine(first, time(0), tzinfo=tzinfo)
+        return cls(start=start, end=start + timedelta(days=count), **kwargs)
+
+    def to_mongo(self):
+        """
+        MongoDB filter and projection of the query.
+        """
+        query = {}
+        if self.start is not None or self.end is not None:
+            query["start_date"] = {}
+            if self.start is not None:
+                query["start_date"]["$gte"] = self.start
+            if self.end is not None:
+                query["start_date"]["$lt"] = self.end
+        if self.weekdays:
+            query["day"] = {"$in": [WEEKDAY_NAMES[day] for day in self.weekdays]}
+        if self.location:
+            query["location"] = {"$regex": re.escape(self.location), "$options": "i"}
+        if self.dances:
+            query["dances"] = {"$in": self.dances}
+
+        projection = None
+        if self.fields:
+            projection = {field: 1 for field in self.fields}
+            projection.setdefault("_id", 0)
+        return query, projection
+
+    def matches(self, document) -> bool:
+        """
+        Evaluate the query on a stored document (to_json_storage dictionary), for backends without query engine.
+        """
+        start_date = document.get("start_date")
+        if self.start is not None and (start_date is None or start_date < self.start):
+            return False
+        if self.end is not None and (start_date is None or start_date >= self.end):
+            return False
+        if self.weekdays and (start_date is None or start_date.weekday() not in self.weekdays):
+            return False
+        if self.location and self.location.casefold() not in str(document.get("location") or "").casefold():
+            return False
+        if self.dances and not set(self.dances) & set(document.get("dances") or []):
+            return False
+        return True
+
+    def project(self, document):
+        if not self.fields:
+            return document
+        return {field: document.get(field) for field in self.fields}
+
+
+def paginate(results: Iterable, page_size: int) -> Iterable[List]:
+    # group any result iterator into pages without loading everything
+    page = []
+    for result in results:
+        page.append(result)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# coding: utf-8
+import logging
+import re
+import unicodedata
+from datetime import date, datetime, time, timedelta
+
+import dateparser
+from babel.dates import format_date
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    from backports.zoneinfo import ZoneInfo
+
+TIMEZONE = "Europe/Paris"
+DATE_LOCALE = "fr_FR"
+
+MONTHS = {
+    "janvier": 1,
+    "janv": 1,
+    "jan": 1,
+    "fevrier": 2,
+    "fevr": 2,
+    "fev": 2,
+    "mars": 3,
+    "mar": 3,
+    "avril": 4,
+    "avr": 4,
+    "mai": 5,
+    "juin": 6,
+    "juillet": 7,
+    "juil": 7,
+    "aout": 8,
+    "septembre": 9,
+    "sept": 9,
+    "sep": 9,
+    "octobre": 10,
+    "oct": 10,
+    "novembre": 11,
+    "nov": 11,
+    "decembre": 12,
+    "dec": 12,
+}
+
+# cache miss marker, None is a valid cached result
+_MISSING = object()
+
+# weekday names as displayed, monday first, computed once instead of a babel call per event
+WEEKDAY_NAMES = tuple(
+    format_date(date(2024, 1, 1) + timedelta(days=i), "eeee", locale=DATE_LOCALE).capitalize() for i in range(7)
+)
+
+WEEKDAYS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+
+def normalize(text):
+    # lower case, no accents, no surrounding punctuation
+    text = unicodedata.normalize("NFKD", text.strip().lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.strip(".,;")
+
+
+class FrenchDateParser(object):
+    """
+    Fast parser for the date and time formats found on planning posters:
+    dd/mm, dd/mm/yyyy, "12 novembre [2022]" and HHhMM, HH:MM, HHh times.
+    Regular expressions are compiled once and results are memoized, anything else falls back to dateparser.
+    """
+
+    NUMERIC_DATE = re.compile(r"^(\d{1,2})[/.\-](\d{1,2})(?:[/.\-](\d{2}|\d{4}))?$")
+    TEXT_DATE = re.compile(
+        r"^(?:(?:" + "|".join(WEEKDAYS) + r")\s+)?(\d{1,2})(?:er)?\s+([a-z]+)\.?(?:\s+(\d{4}))?$"
+    )
+    TIME = re.compile(r"^(\d{1,2})\s*[h:]\s*(\d{2})?$")
+
+    def __init__(self, timezone=TIMEZONE, cache_size=4096):
+        self.tzinfo = ZoneInfo(timezone)
+        self.settings = {"TIMEZONE": timezone, "RETURN_AS_TIMEZONE_AWARE": True}
+        self.cache_size = cache_size
+        self._dates = {}
+        self._times = {}
+        self.hits = 0
+        self.parsed = 0
+        self.fallbacks = 0
+
+    def _remember(self, cache, key, value):
+        # the parser is shared by the parsing threads: caches are only read with a single get() call,
+        # so a clear() from another thread can not happen between a membership test and the read
+        if len(cache) >= self.cache_size:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def _fallback(self, text):
+        self.fallbacks += 1
+        logging.debug("Date parser fallback: " + repr(text))
+        return dateparser.parse(text, languages=["fr"], settings=self.settings)
+
+    def parse_date(self, text, today=None):
+        """
+        Parse a date as a timezone aware datetime at midnight. Dates without year are in the current year.
+        Returns None when the text can not be parsed.
+        """
+        today = today or date.today()
+        # dates without year (and relative fallback dates) depend on the current day
+        key = (text, today)
+        result = self._dates.get(key, _MISSING)
+        if result is not _MISSING:
+            self.hits += 1
+            return result
+
+        value = normalize(text)
+        day = month = year = None
+
+        match = self.NUMERIC_DATE.match(value)
+        if match:
+            day, month, year = match.groups()
+            month = int(month)
+        else:
+            match = self.TEXT_DATE.match(value)
+            if match:
+                day, month, year = match.groups()
+                month = MONTHS.get(month)
+
+        result = None
+        if day and month:
+            year = int(year) if year else today.year
+            if year < 100:
+                year += 2000
+            try:
+                result = datetime(year, month, int(day), tzinfo=self.tzinfo)
+                self.parsed += 1
+            except ValueError:
+                result = None
+
+        if result is None:
+            result = self._fallback(text)
+        return self._remember(self._dates, key, result)
+
+    def parse_time(self, text):
+        """
+        Parse a time of day as a timezone aware time. Returns None when the text can not be parsed.
+        """
+        result = self._times.get(text, _MISSING)
+        if result is not _MISSING:
+            self.hits += 1
+            return result
+
+        result = None
+        match = self.TIME.match(normalize(text))
+        if match:
+            hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            if hour < 24 and minute < 60:
+                result = time(hour, minute, tzinfo=self.tzinfo)
+                self.parsed += 1
+
+        if result is None:
+            parsed = self._fallback(text)
+            result = parsed.timetz() if parsed is not None else None
+        return self._remember(self._times, text, result)
+
+    def stats(self):
+        return {"hits": self.hits, "parsed": self.parsed, "fallbacks": self.fallbacks}
+
+
+# shared instance, keeps its cache across parsers
+default_parser = FrenchDateParser()
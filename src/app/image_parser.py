@@ -1,24 +1,39 @@
 #!/usr/bin/python
 # coding: utf-8
+import hashlib
 import logging
 from abc import ABC, abstractmethod
 from datetime import date, datetime, timedelta
 import json
 from typing import Any
 from PIL import Image
+import re
 from pytesseract import pytesseract
-from pytesseract import Output
 from csv import Dialect
 import cv2
 import csv
-import re
-import dateparser
+import threading
+import time
+import numpy as np
+from collections import namedtuple
+from sortedcontainers import SortedKeyList
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import image_utils
-from babel.dates import format_date
+import ocr_engines
+import ocr_layout
+import french_dates
+import event_exporter
+from ocr_corrections import CorrectionRules, FIELD_DATE, FIELD_TIME, FIELD_DESCRIPTION
+from french_dates import DATE_LOCALE, WEEKDAY_NAMES
+from ocr_engines import PytesseractEngine
 from babel.dates import format_datetime
-from babel.dates import format_time
 
-DATE_LOCALE = "fr_FR"
+PARSE_OK = "ok"
+PARSE_EMPTY = "empty"
+PARSE_FAILED = "failed"
+
+# events: every event read on the image, added: those new to the planning
+ParseResult = namedtuple("ParseResult", ["image", "events", "status", "duration", "error", "stats", "added"])
 
 
 class CsvTextBuilder(object):
@@ -37,14 +52,97 @@ class CSVStandardDialect(Dialect):
     quoting = csv.QUOTE_MINIMAL
 
 
+def normalize_description(description):
+    # case and spacing insensitive form of a description, used to identify an event
+    return " ".join(str(description or "").split()).casefold()
+
+
+def format_day_text(value):
+    # same output as format_date(value, "dd/MM/yyyy")
+    return "{:02d}/{:02d}/{:04d}".format(value.day, value.month, value.year)
+
+
+def format_hour_text(value):
+    # same output as format_time(value, "HH:mm")
+    return "{:02d}:{:02d}".format(value.hour, value.minute)
+
+
 class Event(ABC):
+    __slots__ = ("_start_date", "_end_date", "_display", "description", "location")
+
     def __init__(self, start_date: datetime, description: str = "", end_date: datetime = None, location: str = ""):
+        self._display = None
         self.start_date = start_date
         self.end_date = end_date
-        self.day = format_date(self.start_date, "eeee", locale=DATE_LOCALE).capitalize()
         self.description = description
         self.location = location
 
+    @property
+    def start_date(self):
+        return self._start_date
+
+    @start_date.setter
+    def start_date(self, value):
+        self._start_date = value
+        self._display = None
+
+    @property
+    def end_date(self):
+        return self._end_date
+
+    @end_date.setter
+    def end_date(self, value):
+        self._end_date = value
+        self._display = None
+
+    @property
+    def display(self):
+        """
+        Display strings (day, start date, end date, hours), computed on first use and kept until a date changes.
+        """
+        if self._display is None:
+            start, end = self._start_date, self._end_date
+            hours = format_hour_text(start)
+            end_text = ""
+            if end is not None:
+                hours = hours + "-" + format_hour_text(end)
+                end_text = format_day_text(end)
+            self._display = (WEEKDAY_NAMES[start.weekday()], format_day_text(start), end_text, hours)
+        return self._display
+
+    @property
+    def day(self):
+        return self.display[0]
+
+    @property
+    def key(self):
+        # canonical identity: the same event read on two posters has the same key
+        return (self.start_date, self.end_date, normalize_description(self.description))
+
+    @property
+    def storage_key(self):
+        # string form of the canonical key, unique in the event stores
+        start, end, description = self.key
+        return start.isoformat() + "|" + (end.isoformat() if end is not None else "") + "|" + description
+
+    @property
+    def fingerprint(self):
+        # content hash (start, end, description, location): changes when anything stored about the event changes
+        start, end, description = self.key
+        content = "|".join(
+            [start.isoformat(), end.isoformat() if end is not None else "", description,
+             normalize_description(self.location)]
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
     @abstractmethod
     def __str__(self):
         pass
@@ -63,12 +161,10 @@ class Event(ABC):
 
 
 class DanceEvent(Event):
-
-    DATE_TEXT_FORMAT = "dd/MM/yyyy"
-    TIME_TEXT_FORMAT = "HH:mm"
+    __slots__ = ("dances", "raw")
 
     def __init__(
-        self, start_date: datetime, description: str = "", end_date: datetime = None, location: str = "", dances=[], raw = str
+        self, start_date: datetime, description: str = "", end_date: datetime = None, location: str = "", dances=[], raw=None
     ):
         super().__init__(start_date=start_date, description=description, end_date=end_date, location=location)
         self.dances = dances
@@ -76,6 +172,8 @@ class DanceEvent(Event):
 
     def to_json_storage(self):
         return {
+            "key": self.storage_key,
+            "fingerprint": self.fingerprint,
             "day": self.day,
             "start_date": self.start_date,
             "end_date": self.end_date,
@@ -84,17 +182,22 @@ class DanceEvent(Event):
             "dances": self.dances,
             "raw" : json.dumps(self.raw)
         }
-    def __iter__(self):
-        hours = format_time(self.start_date, self.TIME_TEXT_FORMAT, locale=DATE_LOCALE)
-        start_date = format_date(self.start_date, format=self.DATE_TEXT_FORMAT, locale=DATE_LOCALE)
-        end_date = ""
 
-        if not self.end_date is None:
-            hours = hours + "-" + format_time(self.end_date, self.TIME_TEXT_FORMAT, locale=DATE_LOCALE)
-            end_date = format_date(self.end_date, format=self.DATE_TEXT_FORMAT, locale=DATE_LOCALE)
+    @classmethod
+    def from_json_storage(cls, data):
+        return cls(
+            start_date=data["start_date"],
+            end_date=data.get("end_date"),
+            description=data.get("description", ""),
+            location=data.get("location", ""),
+            dances=data.get("dances", []),
+            raw=json.loads(data["raw"]) if data.get("raw") else None,
+        )
 
+    def __iter__(self):
+        day, start_date, end_date, hours = self.display
         yield from {
-            "day": self.day,
+            "day": day,
             "start_date": start_date,
             "end_date": end_date,
             "hours": hours,
@@ -110,50 +213,78 @@ class DanceEvent(Event):
         return self.__str__()
 
     def toJSON(self):
-        return self.__str__(self)
+        return self.__str__()
 
     def short_infos(self):
-        desc = '{0} {1}-{2} | {3}'.format(
-            format_date(self.start_date, 'dd/MM/yyyy', locale=DATE_LOCALE),
-            format_time(self.start_date, 'HH:mm', locale=DATE_LOCALE),
-            format_time(self.end_date, 'HH:mm', locale=DATE_LOCALE),
-            self.description)
-        return desc
+        day, start_date, end_date, hours = self.display
+        if self.end_date is None:
+            hours = hours + "-"
+        return '{0} {1} | {2}'.format(start_date, hours, self.description)
+
 
 class Planning(ABC):
-    events = []
+    """
+    Events indexed by their canonical key (insertion ordered, O(1) duplicate detection)
+    and by start date for range queries.
+    """
 
     def __init__(self):
-        pass
+        self._events = {}
+        self._by_date = SortedKeyList(key=lambda event: event.start_date)
+
+    @property
+    def events(self):
+        return list(self._events.values())
 
     def add(self, event: Event):
+        # returns the events actually added (duplicates excluded)
+        added = []
         if type(event) is list:
             for e in event:
-                self.add(e)
+                added.extend(self.add(e))
         elif isinstance(event, Event):
-            try:
-                idx = self.events.index(event)
+            key = event.key
+            if key in self._events:
                 logging.warning("Event already exists !")
-            except Exception as e:
-                self.events.append(event)
+            else:
+                self._events[key] = event
+                self._by_date.add(event)
+                added.append(event)
+        return added
 
     def remove(self, event: Event):
         if type(event) is list:
             for e in event:
                 self.remove(e)
         elif isinstance(event, Event):
-            try:
-                if self.events.find(event) > 0:
-                    self.events.remove(event)
-                    self.remove(event)
-            except Exception as e:
+            existing = self._events.pop(event.key, None)
+            if existing is None:
                 logging.warning("Could not find event to remove !")
+            else:
+                self._by_date.remove(existing)
+
+    def get(self, key):
+        return self._events.get(key)
+
+    def between(self, start: datetime = None, end: datetime = None, inclusive=(True, False)):
+        """
+        Events starting between start and end (end excluded by default), ordered by start date.
+        A missing bound leaves the range open on that side.
+        """
+        return list(self._by_date.irange_key(start, end, inclusive=inclusive))
 
-    def clear(self, event: Event):
-        self.events.clear()
+    def clear(self, event: Event = None):
+        self._events.clear()
+        self._by_date.clear()
 
     def count(self):
-        return len(self.events)
+        return len(self._events)
+
+    def __contains__(self, event):
+        return isinstance(event, Event) and event.key in self._events
+
+    def __len__(self):
+        return len(self._events)
 
     @abstractmethod
     def toJSON(self) -> json:
@@ -169,7 +300,6 @@ class Planning(ABC):
 
 
 class DancePlanning(Planning):
-    events = []
 
     def __init__(self):
         super().__init__()
@@ -178,7 +308,7 @@ class DancePlanning(Planning):
         logging.info()
 
     def __str__(self) -> str:
-        return json.dumps(dict(self.events), ensure_ascii=False)
+        return json.dumps([dict(event) for event in self.events], ensure_ascii=False)
 
     def __repr__(self):
         return self.__str__()
@@ -188,15 +318,23 @@ class DancePlanning(Planning):
 
 
 class PlanningParser(ABC):
-    def __init__(self, planning: Planning):
+    def __init__(self, planning: Planning, exporter=None):
         self.__planning = planning
+        # optional event_exporter.EventExporter receiving new events as soon as they are parsed
+        self.exporter = exporter
 
     @property
     def planning(self):
         return self.__planning
 
+    def add_events(self, events, export=True):
+        added = self.planning.add(events)
+        if export and self.exporter is not None and added:
+            self.exporter.write(added)
+        return added
+
     @abstractmethod
-    def parse_data(self, details):
+    def parse_data(self, details, stats=None):
         pass
 
     @abstractmethod
@@ -211,172 +349,290 @@ class PlanningParser(ABC):
     def write_to_csv(self, data, path):
         pass
 
-    def process(self, image, path):
+    def refine(self, image, details):
+        # optional second OCR pass, returns improved details and statistics
+        return details, {}
+
+    def extract(self, image):
+        # OCR and parse an image without touching the planning, returns events and OCR statistics
+        events = []
+        stats = {}
+        # image handles are only decoded now
+        if isinstance(image, image_utils.ImageHandle):
+            image = image.load()
         image = self.prepare(image)
         details = self.ocr(image)
         if not (details is None):
-            events = self.parse_data(details)
-            self.planning.add(events)
-            logging.info(">> Added Events: " + str(len(events)))
+            details, stats = self.refine(image, details)
+            events = self.parse_data(details, stats)
+        return events, stats
+
+    def process(self, image, path=None):
+        # path: optional export file, new events are appended to it
+        events, stats = self.extract(image)
+        added = self.add_events(events)
+        if path:
+            with event_exporter.get_exporter(path) as exporter:
+                exporter.write(added)
+        logging.info(">> Added Events: " + str(len(events)))
         logging.info(">> Total Events: " + str(self.planning.count()))
+        return events
+
+    def process_many(self, images, workers=1):
+        """
+        OCR and parse several images on a bounded pool of threads, reusing this parser.
+        ParseResult tuples are yielded as soon as each image is done (not in input order),
+        events are added to the planning from the calling thread and the result lists the ones actually added.
+        """
+
+        def run(image):
+            start = time.perf_counter()
+            try:
+                events, stats = self.extract(image)
+                status, error = (PARSE_OK if events else PARSE_EMPTY), None
+            except Exception as e:
+                events, stats, status, error = [], {}, PARSE_FAILED, e
+            return ParseResult(image, events, status, time.perf_counter() - start, error, stats, [])
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(run, image) for image in images]
+            for future in as_completed(futures):
+                result = future.result()
+                yield result._replace(added=self.add_events(result.events))
 
 
 class DancePlanningParser(PlanningParser):
-    planning = DancePlanning()
 
-    def __init__(self, path_to_tesseract):
-        super().__init__(self.planning)
+    # configuring parameters for tesseract
+    OCR_CONFIG = r"-l eng+fre --oem 3 --psm 6"
+    OCR_WIDTH = 2000
+
+    def __init__(
+        self,
+        path_to_tesseract,
+        engine=None,
+        regions=None,
+        detector=image_utils.DETECTOR_HSV,
+        region_workers=1,
+        corrections=None,
+        min_confidence=ocr_layout.MIN_CONFIDENCE,
+        reocr_scale=None,
+        reocr_psm=7,
+        exporter=None,
+    ):
+        super().__init__(DancePlanning(), exporter)
 
         self.path_to_tesseract = path_to_tesseract
         # configure Tesseract
         # point tessaract_cmd to tessaract.exe
         pytesseract.tesseract_cmd = path_to_tesseract
 
-    def process(self, image, path):
-        super().process(image, path)
+        # OCR backend, engines keeping models loaded can be shared across parsers
+        self.engine = engine if engine is not None else PytesseractEngine(path_to_tesseract)
+
+        # words below this confidence flag their line
+        self.min_confidence = min_confidence
+
+        # low confidence lines are OCR'd again, upscaled, when a scale is set
+        self.reocr_scale = reocr_scale
+        self.reocr_config = re.sub(r"--psm \d+", "--psm " + str(reocr_psm), self.OCR_CONFIG)
+
+        # OCR typo fixes applied to each field
+        self.corrections = corrections if corrections is not None else CorrectionRules()
+
+        # color profiles locating planning regions: only those regions are OCR'd when set
+        self.regions = regions
+        self.detector = detector
+        self.region_workers = region_workers
+        # region OCR threads live as long as the parser: engines keep their models loaded per thread
+        self.region_executor = None
+        self.region_lock = threading.Lock()
+
+    def process(self, image, path=None):
+        return super().process(image, path)
 
-    def parse_data(self, details):
+    @classmethod
+    def settings(cls):
+        # everything affecting parse results, used to invalidate cached results
+        return {"ocr_config": cls.OCR_CONFIG, "ocr_width": cls.OCR_WIDTH}
+
+    def parse_data(self, details, stats=None):
+        # stats, when given, counts the skipped lines: events of those lines are missing
         events = []
+        corrections = self.corrections
         try:
-            # convert words to lines
-            parse_text = []
-            word_list = []
-            last_word = ""
-            for word in details["text"]:
-                # non empty strings are considered valid words
-                if word != "":
-                    word_list.append(word)
-                    last_word = word
-                # a sentence ends when current word is empty and previous wasn't
-                if last_word != "" and word == "":
-                    parse_text.append(word_list)
-                    word_list = []
+            # convert words to lines, with words sorted in day / date / time / description columns
+            lines = ocr_layout.build_lines(details, self.min_confidence)
 
             # parse lines one by one
-            data = []
-            for line in parse_text:
-                start_date = None
-                end_date = None
+            for line in lines:
                 start_time = None
                 end_time = None
                 description = ""
-                pos = 0
+                day_words, date_words, time_words, description_words = line.columns
+
+                # first column is the litteral day
+                day = " ".join(day_words)
+
+                # fix potential typos, OCR may split the date in several words
+                # parse french date and format as dd/mm/yyyy
+                start_date = corrections.correct(FIELD_DATE, "".join(date_words)) if date_words else None
+
+                # depending if time has start/end hours, split the word to isolate both and format as HH24:MI
+                if time_words:
+                    word = corrections.correct(FIELD_TIME, "".join(time_words))
+                    minus_pos = word.find("-")
+                    if minus_pos != -1:
+                        time_parts = word.split("-")
+                        start_time = time_parts[0]
+                        end_time = time_parts[1]
+                    else:
+                        start_time = word
+                        end_time = "00:00"
 
-                # word type depends on its position
                 # post-Process words and apply transformations if needed before storing into array
-                for word in line:
-
-                    # first word is the litteral day
-                    if pos == 0:
-                        day = word
-                    elif pos == 1:
-                        # fix potential typos
-                        word = word.replace("S", "5") \
-                                   .replace("I", "1") \
-                                   .replace("O", "0") \
-                                   .replace("§", "5") \
-                                   .replace("T", "7")
-                        start_date = word
-                        # parse french date and format as dd/mm/yyyy
-                    elif pos == 2:
-                        # depending if time has start/end hours, split the word to isolate both and format as HH24:MI
-                        word = word.replace("S", "5") \
-                                   .replace("I", "1") \
-                                   .replace("O", "0") \
-                                   .replace("§", "5") \
-                                   .replace("T", "7")
-                        word = word.replace("h", ":")  # fix time format
-                        word = word.replace("24:00", "00:00")  # fix hours
-                        minus_pos = word.find("-")
-                        if minus_pos != -1:
-                            time_parts = word.split("-")
-                            start_time = time_parts[0]
-                            end_time = time_parts[1]
-                        else:
-                            start_time = word
-                            end_time = "00:00"
+                for word in description_words:
+                    # fix weird words, typographical quotes and missing initial consonant
+                    word = corrections.correct(FIELD_DESCRIPTION, word, first=(description == ""))
+
+                    # append all remaining words
+                    if description == "":
+                        description = word
                     else:
-                        # fix weird words
-                        if word.lower() == "wes":
-                            word = "WCS"
-                        elif word.lower() == "dj":
-                            word = "DJ"
-                        elif word.lower() == "sbk":
-                            word = "SBK"
-
-                        # fix typographical quotes - don't need that crap
-                        word = word.replace("‘", "'").replace("’", "'").replace("“", '"').replace("”", '"')
-                        word = word.replace("I'", "L'")  # fix I' => L'
-                        word = word.replace("lmpasse", "Impasse")                        
-
-                        # fix uncapitalized consonant + apostrophe
-                        regexp = re.compile(r'^([a-zA-Z]\').*')
-                        if regexp.search(word):
-                            word = word[0:2].upper() + word[2:]
-
-                        # fix missing initial consonant before apostrophe => guesss L
-                        # if word starts by apostrophe and a vowel, add an L, else remove the '
-                        if description == "":
-                            if word[0:1] == "'":
-                                regexp = re.compile(r'^\'[aeiouyAEIOUY\u00C0-\u017F]+.*')
-                                if regexp.search(word):
-                                    word = "L" + word
-                                else:
-                                    word = word.lstrip("'")
-
-                        # titlecase if all lower
-                        if word.lower() == word:
-                            word = word.title()
-                        # append all remaining words
-                        if description == "":
-                            description = word
-                        else:
-                            description += " " + word
-                    pos = pos + 1
+                        description += " " + word
 
                 # create Event from extracted data
                 try:
-                    event = DancePlanningParser.parse_event(day, start_date, start_time, end_time, description, line)
+                    event = DancePlanningParser.parse_event(
+                        day, start_date, start_time, end_time, description, list(line.words)
+                    )
                     events.append(event)
                 except Exception as e:
-                    logging.error("Failed to generate event from raw data !")
-                    raise e
+                    # skip the line only, following lines may still be valid
+                    flag = " (low confidence)" if line.low_confidence else ""
+                    logging.error("Failed to generate event from raw data" + flag + ": " + " ".join(line.words))
+                    logging.debug(e)
+                    if stats is not None:
+                        stats["skipped_lines"] = stats.get("skipped_lines", 0) + 1
 
         except Exception as e:
             logging.info(e)
             logging.info("Could not parse image.")
+            if stats is not None:
+                stats["skipped_lines"] = stats.get("skipped_lines", 0) + 1
 
         finally:
             return events
 
     def write_to_csv(self, data, path):
-        # write to CSV
-        header = ["day", "date", "start_time", "end_time", "event"]
-
-        csv.register_dialect("CSVStandardDialect", CSVStandardDialect)
-
-        with open(path, "w", encoding="utf-8", newline="") as f:
-            f.write("\ufeff")
-            writer = csv.writer(f, dialect="CSVStandardDialect")
-            # write the header
-            writer.writerow(header)
-            # write multiple rows
-            writer.writerows(data)
+        # write events to CSV, replacing the file
+        with event_exporter.CsvEventExporter(path, append=False) as exporter:
+            exporter.write(data)
 
     def ocr(self, image):
-        # configuring parameters for tesseract
-        custom_config = r"-l eng+fre --oem 3 --psm 6"
+        if self.regions:
+            return self.ocr_regions(image)
 
         # extract text from image to a json structure
         # text = pytesseract.image_to_string(image)
-        details = pytesseract.image_to_data(image, output_type=Output.DICT, config=custom_config)
+        details = self.engine.image_to_data(image, self.OCR_CONFIG)
         return details
 
+    def refine(self, image, details):
+        """
+        Re-OCR the lines having low confidence words at a higher scale (and as single text lines),
+        and splice the new words in when their mean confidence is better.
+        """
+        stats = {"reocr_regions": 0, "reocr_improved": 0, "reocr_time": 0.0}
+        if not self.reocr_scale:
+            return details, stats
+
+        start = time.perf_counter()
+        (height, width) = image.shape[:2]
+        scale = self.reocr_scale
+        replacements = {}
+        for line, (x, y, w, h), confidence in ocr_layout.line_boxes(details, self.min_confidence):
+            # small margin around the line, tesseract needs some background
+            pad = max(4, h // 4)
+            x1, y1 = max(0, x - pad), max(0, y - pad)
+            x2, y2 = min(width, x + w + pad), min(height, y + h + pad)
+            crop = cv2.resize(image[y1:y2, x1:x2], None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+            data = self.engine.image_to_data(crop, self.reocr_config)
+            stats["reocr_regions"] += 1
+
+            rows = []
+            for i in range(len(data["text"])):
+                if data["level"][i] != 5 or not str(data["text"][i]).strip():
+                    continue
+                rows.append(
+                    {
+                        "level": 5,
+                        "page_num": details["page_num"][0] if "page_num" in details else 1,
+                        "block_num": line[0],
+                        "par_num": line[1],
+                        "line_num": line[2],
+                        "word_num": len(rows) + 1,
+                        "left": x1 + int(data["left"][i] / scale),
+                        "top": y1 + int(data["top"][i] / scale),
+                        "width": int(data["width"][i] / scale),
+                        "height": int(data["height"][i] / scale),
+                        "conf": data["conf"][i],
+                        "text": data["text"][i],
+                    }
+                )
+            if rows and sum(float(row["conf"]) for row in rows) / len(rows) > confidence:
+                replacements[line] = rows
+
+        details = ocr_layout.splice_lines(details, replacements)
+        stats["reocr_improved"] = len(replacements)
+        stats["reocr_time"] = time.perf_counter() - start
+        logging.info(
+            ">> Re-OCR: " + str(stats["reocr_regions"]) + " line(s), " + str(stats["reocr_improved"])
+            + " improved in " + "{:.2f}".format(stats["reocr_time"]) + " s"
+        )
+        return details, stats
+
+    def get_region_executor(self):
+        # shared by the process_many threads
+        with self.region_lock:
+            if self.region_executor is None:
+                self.region_executor = ThreadPoolExecutor(
+                    max_workers=self.region_workers, thread_name_prefix="ocr-region"
+                )
+            return self.region_executor
+
+    def close(self):
+        if self.region_executor is not None:
+            self.region_executor.shutdown()
+            self.region_executor = None
+
+    def ocr_regions(self, image):
+        """
+        OCR only the color bands detected by the region profiles and merge the words back in reading order.
+        Falls back to the full image when no region is found.
+        """
+        boxes = image_utils.get_color_regions(image, self.regions, self.detector)
+        if not boxes:
+            logging.info(">> No planning region detected, OCR on full image")
+            return self.engine.image_to_data(image, self.OCR_CONFIG)
+
+        logging.info(">> OCR on " + str(len(boxes)) + " planning region(s)")
+        crops = [np.ascontiguousarray(image[y : y + h, x : x + w]) for x, y, w, h in boxes]
+        if self.region_workers > 1 and len(crops) > 1:
+            results = list(
+                self.get_region_executor().map(lambda crop: self.engine.image_to_data(crop, self.OCR_CONFIG), crops)
+            )
+        else:
+            results = [self.engine.image_to_data(crop, self.OCR_CONFIG) for crop in crops]
+
+        parts = [(data, (x, y)) for data, (x, y, w, h) in zip(results, boxes)]
+        return ocr_engines.merge_data(parts, image.shape[1], image.shape[0])
+
     def prepare(self, image):
         source = image.copy()
 
         # increase image size to get a better number of pixels per characters
-        image = image_utils.image_resize(image, width=2000)
+        image = image_utils.image_resize(image, width=self.OCR_WIDTH)
         resized = image.copy()
 
         # Perform transformations on image to enhance OCR
@@ -409,24 +665,21 @@ class DancePlanningParser(PlanningParser):
 
         # leave day - discarded for now
         description = description
-        parser_settings = {'TIMEZONE': 'Europe/Paris', 'RETURN_AS_TIMEZONE_AWARE': True}
+        date_parser = french_dates.default_parser
+
         # format start date
-        start_date = dateparser.parse(start_date, languages=["fr"], settings=parser_settings)
+        start_date = date_parser.parse_date(start_date)
         end_date = start_date
 
         # create single datetime from date and time
-        start_time = dateparser.parse(start_time, languages=["fr"], settings=parser_settings)
-        start_time = start_time.timetz()
-        start_datetime = start_date
+        start_time = date_parser.parse_time(start_time)
         start_datetime = datetime.combine(start_date, start_time)
 
         # create single datetime from date and time
-        end_time = dateparser.parse(end_time, languages=["fr"], settings=parser_settings)
-        end_time = end_time.timetz()
+        end_time = date_parser.parse_time(end_time)
         # adjust end_date to the next day when end_date is earlier than start_time
         if start_time.hour > end_time.hour:
             end_date = start_date + timedelta(days=1)
-        end_datetime = end_date
         end_datetime = datetime.combine(end_date, end_time)
 
         event = DanceEvent(
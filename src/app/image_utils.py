@@ -4,6 +4,44 @@ from PIL import Image
 import cv2
 import numpy as np
 import logging
+import os
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+MATCH_TOP = "top"
+MATCH_MED = "med"
+MATCH_LOW = "low"
+
+# color presence computation paths
+METHOD_EXACT = "exact"
+METHOD_COARSE = "coarse"
+
+# width at which the color presence is measured
+PRESENCE_WIDTH = 2000
+
+# width of the thumbnail used by the coarse presence estimator
+COARSE_WIDTH = 250
+
+# reduced resolution decoding flags by scale factor, largest first
+REDUCED_COLOR_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+# color mask detectors
+DETECTOR_HSV = "hsv"
+DETECTOR_LUT = "lut"
+
+# name of the profile built from the single detection range settings
+DEFAULT_PROFILE = "planning"
+
+ColorProfile = namedtuple("ColorProfile", ["name", "lower_hsv", "upper_hsv", "top_threshold", "med_threshold"])
+ClassificationResult = namedtuple(
+    "ClassificationResult", ["path", "presence", "bucket", "method", "profile", "presences"]
+)
 
 
 def image_resize(image, width=None, height=None, inter=cv2.INTER_AREA):
@@ -38,39 +76,528 @@ def image_resize(image, width=None, height=None, inter=cv2.INTER_AREA):
     return resized
 
 
-def get_color_presence(image, lower_hsv, upper_hsv):
-    presence = 0
+def quantized_hsv_colors(bits):
+    """
+    Enumerate the center BGR color of every quantized bin and return them converted to HSV,
+    as a single column image whose row i matches lookup table index i.
+    """
+    shift = 8 - bits
+    levels = np.arange(1 << bits, dtype=np.uint16) << shift
+    if shift:
+        levels += 1 << (shift - 1)
+    b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+    colors = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=-1).astype(np.uint8).reshape(-1, 1, 3)
+    return cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+
+
+def lookup_index(image, bits):
+    # pack quantized b, g, r channels into one table index per pixel
+    shift = 8 - bits
+    channels = image.reshape(-1, 3)
+    if shift:
+        channels = channels >> shift
+    idx = channels[:, 0].astype(np.uint32) << (2 * bits)
+    idx |= channels[:, 1].astype(np.uint32) << bits
+    idx |= channels[:, 2]
+    return idx
+
+
+class ColorLookupDetector(object):
+    """
+    Color range detector backed by a precomputed BGR -> in-range lookup table.
+    The table is built once from the HSV bounds so that each image is classified with a single
+    NumPy indexing pass, without converting the whole frame to HSV.
+    Each BGR channel is quantized on `bits` bits: with 8 bits the table (16 MB) is exact,
+    fewer bits give a smaller table where each bin is tested on its center color.
+    """
+
+    def __init__(self, lower_hsv, upper_hsv, bits=8):
+        if bits < 1 or bits > 8:
+            raise ValueError("bits must be between 1 and 8")
+
+        self.lower_hsv = np.array(lower_hsv)
+        self.upper_hsv = np.array(upper_hsv)
+        self.bits = bits
+        hsv = quantized_hsv_colors(bits)
+        self.lut = cv2.inRange(hsv, self.lower_hsv, self.upper_hsv).ravel().astype(bool)
+
+    def index(self, image):
+        return lookup_index(image, self.bits)
+
+    def mask(self, image):
+        # same output as cv2.inRange on the HSV image: 255 where the color is in range, 0 elsewhere
+        return self.lut[self.index(image)].reshape(image.shape[:2]).view(np.uint8) * np.uint8(255)
+
+    def count(self, image):
+        return int(np.count_nonzero(self.lut[self.index(image)]))
+
+    def check(self, image):
+        """
+        Compare the lookup table mask with the reference cvtColor + inRange mask.
+        Returns the ratio of pixels on which both masks disagree (0.0 when the table is exact).
+        """
+        reference = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), self.lower_hsv, self.upper_hsv)
+        mismatches = np.count_nonzero(reference != self.mask(image))
+        ratio = mismatches / reference.size
+        if mismatches:
+            logging.warning("Lookup table mismatch on " + "{:.4f}".format(ratio * 100) + " % of pixels")
+        return ratio
+
+
+class ProfileLookupDetector(object):
+    """
+    Lookup table detector evaluating several HSV ranges at once.
+    Each table entry is a bit field where bit i is set when the color is within range i, so a single
+    indexing pass followed by a histogram of the bit fields gives the pixel count of every range.
+    """
+
+    def __init__(self, ranges, bits=8):
+        if bits < 1 or bits > 8:
+            raise ValueError("bits must be between 1 and 8")
+        if len(ranges) < 1 or len(ranges) > 16:
+            raise ValueError("between 1 and 16 color ranges are supported")
+
+        self.ranges = [(np.array(lower_hsv), np.array(upper_hsv)) for lower_hsv, upper_hsv in ranges]
+        self.bits = bits
+        dtype = np.uint8 if len(self.ranges) <= 8 else np.uint16
+
+        hsv = quantized_hsv_colors(bits)
+        self.lut = np.zeros(hsv.shape[0], dtype=dtype)
+        for i, (lower_hsv, upper_hsv) in enumerate(self.ranges):
+            in_range = cv2.inRange(hsv, lower_hsv, upper_hsv).ravel().astype(bool)
+            self.lut[in_range] |= dtype(1 << i)
+
+        # bit i of every possible bit field value, used to turn the histogram into per range counts
+        values = np.arange(1 << len(self.ranges), dtype=np.uint32)
+        self.bit_table = np.stack([(values >> i) & 1 for i in range(len(self.ranges))], axis=1)
+
+    def counts(self, image):
+        fields = self.lut[lookup_index(image, self.bits)]
+        histogram = np.bincount(fields, minlength=1 << len(self.ranges))
+        return histogram @ self.bit_table
+
+    def mask(self, image):
+        # 255 where the color is within any of the ranges
+        fields = self.lut[lookup_index(image, self.bits)]
+        return (fields != 0).reshape(image.shape[:2]).view(np.uint8) * np.uint8(255)
 
-    resized = image_resize(image, width=2000)
+
+_lookup_detectors = {}
+
+
+def get_lookup_detector(lower_hsv, upper_hsv, bits=8):
+    # tables only depend on the bounds, build them once per process
+    key = (tuple(int(v) for v in lower_hsv), tuple(int(v) for v in upper_hsv), bits)
+    detector = _lookup_detectors.get(key)
+    if detector is None:
+        detector = ColorLookupDetector(lower_hsv, upper_hsv, bits=bits)
+        _lookup_detectors[key] = detector
+    return detector
+
+
+def get_profile_detector(profiles, bits=8):
+    key = (
+        tuple((tuple(int(v) for v in p.lower_hsv), tuple(int(v) for v in p.upper_hsv)) for p in profiles),
+        bits,
+    )
+    detector = _lookup_detectors.get(key)
+    if detector is None:
+        detector = ProfileLookupDetector([(p.lower_hsv, p.upper_hsv) for p in profiles], bits=bits)
+        _lookup_detectors[key] = detector
+    return detector
+
+
+def get_color_mask(image, lower_hsv, upper_hsv, detector=DETECTOR_HSV):
+    if detector == DETECTOR_LUT:
+        return get_lookup_detector(lower_hsv, upper_hsv).mask(image)
 
     # prepare image for better analysis
-    hsv = cv2.cvtColor(resized, cv2.COLOR_BGR2HSV)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
 
     # here we are defining range of color to isolate
-    mask = cv2.inRange(hsv, lower_hsv, upper_hsv)
+    return cv2.inRange(hsv, lower_hsv, upper_hsv)
 
-    # the bitwise and of the frame and mask is done so
-    # that only the blue coloured objects are highlighted
-    result = cv2.bitwise_and(resized, resized, mask=mask)
+
+def get_color_ratio(image, lower_hsv, upper_hsv, detector=DETECTOR_HSV):
+    if detector == DETECTOR_LUT:
+        count = get_lookup_detector(lower_hsv, upper_hsv).count(image)
+    else:
+        count = np.count_nonzero(get_color_mask(image, lower_hsv, upper_hsv, detector))
+    return round(count / (image.shape[0] * image.shape[1]) * 100, 1)
+
+
+def get_color_presence(image, lower_hsv, upper_hsv, detector=DETECTOR_HSV):
+    resized = image_resize(image, width=PRESENCE_WIDTH)
 
     # debug result in separate windows
+    # mask = get_color_mask(resized, lower_hsv, upper_hsv, detector)
     # cv2.imshow('Original',image)
     # cv2.imshow('Mask',mask)
-    # cv2.imshow('Result',result)
+    # cv2.imshow('Result',cv2.bitwise_and(resized, resized, mask=mask))
     # cv2.waitKey(0)
     # cv2.destroyAllWindows()
 
-    # if mask.size > 0:
-    presence = round(np.count_nonzero(mask) / np.size(mask) * 100, 1)
+    presence = get_color_ratio(resized, lower_hsv, upper_hsv, detector)
 
     return round(presence, 2)
 
 
-def load_image(path):
-    # Open Image
-    image = cv2.imread(path)
+def get_profile_ratios(image, profiles, detector=DETECTOR_HSV):
+    # evaluate every profile on a single pass over the image
+    pixels = image.shape[0] * image.shape[1]
+    if detector == DETECTOR_LUT:
+        counts = get_profile_detector(profiles).counts(image)
+    else:
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        counts = [np.count_nonzero(cv2.inRange(hsv, p.lower_hsv, p.upper_hsv)) for p in profiles]
+    return [round(float(count) / pixels * 100, 1) for count in counts]
+
+
+def get_profiles_mask(image, profiles, detector=DETECTOR_HSV):
+    # union of the masks of every profile
+    if detector == DETECTOR_LUT:
+        return get_profile_detector(profiles).mask(image)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, profiles[0].lower_hsv, profiles[0].upper_hsv)
+    for profile in profiles[1:]:
+        mask |= cv2.inRange(hsv, profile.lower_hsv, profile.upper_hsv)
+    return mask
+
+
+def get_color_regions(image, profiles, detector=DETECTOR_HSV, min_area=0.002, padding=10):
+    """
+    Bounding boxes (x, y, w, h) of the color bands detected by the profiles, in reading order.
+    Bands are closed horizontally so that text written over them does not split them, boxes smaller
+    than min_area (ratio of the image area) are dropped and overlapping padded boxes are merged.
+    """
+    (h, w) = image.shape[:2]
+    mask = get_profiles_mask(image, profiles, detector)
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, w // 50), max(3, h // 200)))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    boxes = []
+    for i in range(1, count):
+        x, y, bw, bh, area = stats[i]
+        if area < min_area * w * h:
+            continue
+        x1, y1 = max(0, x - padding), max(0, y - padding)
+        x2, y2 = min(w, x + bw + padding), min(h, y + bh + padding)
+        boxes.append([int(x1), int(y1), int(x2), int(y2)])
+
+    # merge overlapping boxes until stable
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    boxes.sort(key=lambda box: (box[1], box[0]))
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in boxes]
+
+
+def get_profile_presences(image, profiles, detector=DETECTOR_HSV):
+    resized = image_resize(image, width=PRESENCE_WIDTH)
+    return [round(ratio, 2) for ratio in get_profile_ratios(resized, profiles, detector)]
+
+
+def estimate_profile_presences(image, profiles, margin, coarse_width=COARSE_WIDTH, detector=DETECTOR_HSV):
+    """
+    Coarse-to-fine color presence: measure presence on a small thumbnail first and only run the
+    full resolution computation when an estimate falls within margin of one of its profile thresholds.
+    Returns the presences and the method used to compute them.
+    """
+    if margin is None or image.shape[1] <= coarse_width:
+        return get_profile_presences(image, profiles, detector), METHOD_EXACT
+
+    estimates = get_profile_ratios(image_resize(image, width=coarse_width), profiles, detector)
+
+    # close to a threshold, the thumbnail may fall on the wrong side: compute exact value
+    if near_threshold(profiles, estimates, margin):
+        return get_profile_presences(image, profiles, detector), METHOD_EXACT
+
+    return [round(estimate, 2) for estimate in estimates], METHOD_COARSE
+
+
+def near_threshold(profiles, presences, margin):
+    for profile, presence in zip(profiles, presences):
+        if abs(presence - profile.top_threshold) <= margin or abs(presence - profile.med_threshold) <= margin:
+            return True
+    return False
+
+
+def estimate_color_presence(
+    image, lower_hsv, upper_hsv, top_threshold, med_threshold, margin, coarse_width=COARSE_WIDTH, detector=DETECTOR_HSV
+):
+    profile = ColorProfile(DEFAULT_PROFILE, lower_hsv, upper_hsv, top_threshold, med_threshold)
+    presences, method = estimate_profile_presences(image, [profile], margin, coarse_width, detector)
+    return presences[0], method
+
+
+def get_image_size(path):
+    # only reads the file header, pixels are not decoded
+    with Image.open(path) as image:
+        return image.size
+
+
+def load_image(path, min_width=None):
+    """
+    Open image. When min_width is set, the image is decoded at the smallest reduced resolution
+    (1/2, 1/4 or 1/8) that is still at least min_width pixels wide.
+    JPEG files are natively decoded at that scale, other formats are downscaled right after decoding
+    so that only the reduced array outlives the call.
+    """
+    flag = cv2.IMREAD_COLOR
+    if min_width:
+        width = get_image_size(path)[0]
+        for factor, reduced_flag in REDUCED_COLOR_FLAGS.items():
+            if width // factor >= min_width:
+                flag = reduced_flag
+                break
+
+    image = cv2.imread(path, flag)
     return image
 
 
 def to_np_array(h, s, v):
     return np.array([h, s, v])
+
+
+def content_hash(path, block_size=1 << 20):
+    # hash of the raw file bytes
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def perceptual_hash(path, size=8):
+    """
+    Difference hash (dHash) of an image: compare adjacent pixels of a tiny grayscale thumbnail.
+    Re-encoded or rescaled copies of the same picture get the same hash.
+    """
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    thumbnail = cv2.resize(image, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return "{:0{}x}".format(int("".join("1" if bit else "0" for bit in bits), 2), size * size // 4)
+
+
+def color_signature(path, bins=18, min_saturation=30, min_value=30):
+    """
+    Share of the pixels of each hue bin among colored (saturated and not dark) pixels, followed by the share
+    of colored pixels, measured on a 1/8 scale decode. Grayscale hashes ignore hue: this tells color variants apart.
+    """
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_8)
+    if image is None:
+        return None
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).reshape(-1, 3)
+    colored = hsv[(hsv[:, 1] >= min_saturation) & (hsv[:, 2] >= min_value)]
+    pixels = hsv.shape[0]
+    histogram = np.bincount(colored[:, 0].astype(np.int32) * bins // 180, minlength=bins)
+    return [round(float(count) / pixels, 4) for count in histogram] + [round(len(colored) / pixels, 4)]
+
+
+def same_colors(signature, other, tolerance=0.05):
+    # at most tolerance of the pixels moved between hue bins
+    if signature is None or other is None or len(signature) != len(other):
+        return False
+    return sum(abs(a - b) for a, b in zip(signature, other)) / 2 <= tolerance
+
+
+def get_match_bucket(presence, top_threshold, med_threshold):
+    # route image depending on match quality
+    if presence >= top_threshold:
+        return MATCH_TOP
+    elif presence >= med_threshold:
+        return MATCH_MED
+    return MATCH_LOW
+
+
+class ImageCache(object):
+    """
+    Least recently used cache of decoded images bounded by a memory budget in bytes.
+    Only useful when the same image is loaded several times. Safe to share between parsing threads.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        # decode outside of the lock, other threads keep using the cache meanwhile
+        image = loader()
+        if image is None or image.nbytes > self.budget:
+            # never cached, would evict everything else
+            return image
+
+        with self._lock:
+            if key in self._images:
+                # loaded by another thread in the meantime
+                self._images.move_to_end(key)
+                return self._images[key]
+            self._images[key] = image
+            self.used += image.nbytes
+            while self.used > self.budget:
+                _, evicted = self._images.popitem(last=False)
+                self.used -= evicted.nbytes
+        return image
+
+    def discard(self, key):
+        with self._lock:
+            image = self._images.pop(key, None)
+            if image is not None:
+                self.used -= image.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.used = 0
+
+
+class ImageHandle(object):
+    """
+    Lightweight reference to an image file: pixels are only decoded when load() is called,
+    optionally through a shared ImageCache.
+    Handles are path-like objects and can be given wherever a file path is expected.
+    """
+
+    def __init__(self, path, score=None, bucket=None, profile=None, cache=None):
+        self.path = path
+        self.score = score
+        self.bucket = bucket
+        self.profile = profile
+        self.cache = cache
+        self._hash = None
+        self._size = None
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = content_hash(self.path)
+        return self._hash
+
+    @property
+    def size(self):
+        # (width, height) read from the file header
+        if self._size is None:
+            self._size = get_image_size(self.path)
+        return self._size
+
+    def load(self, min_width=None):
+        if self.cache is None:
+            return load_image(self.path, min_width)
+        return self.cache.get((self.path, min_width), lambda: load_image(self.path, min_width))
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return "ImageHandle(" + repr(self.path) + ", score=" + repr(self.score) + ")"
+
+
+BUCKET_RANKS = {MATCH_TOP: 2, MATCH_MED: 1, MATCH_LOW: 0}
+
+
+def select_profile(profiles, presences):
+    """
+    Pick the best matching profile: highest bucket first, then highest presence relative to
+    the profile top threshold. Returns the profile index and its bucket.
+    """
+    best = None
+    for i, (profile, presence) in enumerate(zip(profiles, presences)):
+        bucket = get_match_bucket(presence, profile.top_threshold, profile.med_threshold)
+        score = (BUCKET_RANKS[bucket], presence / profile.top_threshold if profile.top_threshold else presence)
+        if best is None or score > best[0]:
+            best = (score, i, bucket)
+    return best[1], best[2]
+
+
+def classify_image(path, profiles, margin=None, coarse_width=COARSE_WIDTH, detector=DETECTOR_HSV, reduced=False):
+    """
+    Load an image from disk and compute its color presence for every profile and its match bucket
+    for the winning profile.
+    When margin is set, the coarse-to-fine estimator is used instead of the exact computation.
+    When reduced is set, the image is decoded at the lowest resolution each computation needs:
+    thumbnail size for the estimate, then presence width only if the exact computation is required.
+    Defined at module level so it can be pickled and run by a worker process.
+    """
+    if not reduced:
+        image = load_image(path)
+        presences, method = estimate_profile_presences(image, profiles, margin, coarse_width, detector)
+    else:
+        presences = None
+        # compare the source width: a reduced decode can be exactly coarse_width wide
+        if margin is not None and get_image_size(path)[0] > coarse_width:
+            thumbnail = load_image(path, min_width=coarse_width)
+            estimates = get_profile_ratios(image_resize(thumbnail, width=coarse_width), profiles, detector)
+            if not near_threshold(profiles, estimates, margin):
+                presences, method = [round(estimate, 2) for estimate in estimates], METHOD_COARSE
+            del thumbnail
+
+        if presences is None:
+            image = load_image(path, min_width=PRESENCE_WIDTH)
+            presences, method = get_profile_presences(image, profiles, detector), METHOD_EXACT
+    winner, bucket = select_profile(profiles, presences)
+    return ClassificationResult(
+        path,
+        presences[winner],
+        bucket,
+        method,
+        profiles[winner].name,
+        {profile.name: presence for profile, presence in zip(profiles, presences)},
+    )
+
+
+def classify_images(
+    paths, profiles, workers=1, margin=None, coarse_width=COARSE_WIDTH, detector=DETECTOR_HSV, reduced=False
+):
+    """
+    Classify a list of image files and return ClassificationResult tuples in the same order as paths.
+    When workers is greater than 1, images are decoded and analysed by a pool of worker processes.
+    Only the small result tuples are sent back to the parent process, never the decoded pixels.
+    """
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+
+    count = len(paths)
+    if workers <= 1 or count <= 1:
+        return [classify_image(path, profiles, margin, coarse_width, detector, reduced) for path in paths]
+
+    workers = min(workers, count)
+    chunksize = max(1, count // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # executor.map preserves input order
+        results = executor.map(
+            classify_image,
+            paths,
+            [profiles] * count,
+            [margin] * count,
+            [coarse_width] * count,
+            [detector] * count,
+            [reduced] * count,
+            chunksize=chunksize,
+        )
+        return list(results)
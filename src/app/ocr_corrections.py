@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# coding: utf-8
+import re
+from collections import Counter
+
+FIELD_DATE = "date"
+FIELD_TIME = "time"
+FIELD_DESCRIPTION = "description"
+
+# default rules, matching the historical hard coded fixes of the parser
+DEFAULT_RULES = {
+    FIELD_DATE: {
+        "characters": {"S": "5", "I": "1", "O": "0", "§": "5", "T": "7"},
+    },
+    FIELD_TIME: {
+        "characters": {"S": "5", "I": "1", "O": "0", "§": "5", "T": "7", "h": ":"},
+        "patterns": [
+            {"name": "midnight", "pattern": "24:00", "replace": "00:00"},
+        ],
+    },
+    FIELD_DESCRIPTION: {
+        "words": {"wes": "WCS", "dj": "DJ", "sbk": "SBK"},
+        "characters": {"‘": "'", "’": "'", "“": '"', "”": '"'},
+        "patterns": [
+            {"name": "l-apostrophe", "pattern": "I'", "replace": "L'"},
+            {"name": "impasse", "pattern": "lmpasse", "replace": "Impasse"},
+            {"name": "elision-case", "pattern": "^[a-zA-Z]'", "case": "upper"},
+            {"name": "missing-l", "pattern": "^'(?=[aeiouyAEIOUYÀ-ſ])", "replace": "L'", "first": True},
+            {"name": "leading-quote", "pattern": "^'+", "replace": "", "first": True},
+        ],
+        "titlecase": True,
+    },
+}
+
+
+class CorrectionRule(object):
+    """
+    Precompiled pattern fix. Matches are either replaced by a fixed string or have their case changed.
+    First-only rules apply to the first word of a field.
+    """
+
+    def __init__(self, name, pattern, replace="", case=None, first=False):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.first = first
+        if case == "upper":
+            self.replace = lambda match: match.group(0).upper()
+        elif case == "lower":
+            self.replace = lambda match: match.group(0).lower()
+        else:
+            self.replace = replace
+
+    def apply(self, word):
+        return self.regex.subn(self.replace, word)
+
+
+class FieldCorrections(object):
+    """
+    Corrections of one field type: character fixes compiled to a str.translate table,
+    whole word substitutions as a case insensitive dict lookup and ordered pattern fixes.
+    """
+
+    def __init__(self, field, characters=None, words=None, patterns=None, titlecase=False):
+        self.field = field
+        self.table = str.maketrans(characters) if characters else None
+        self.words = {key.lower(): value for key, value in (words or {}).items()}
+        self.patterns = [CorrectionRule(**pattern) for pattern in (patterns or [])]
+        self.titlecase = titlecase
+
+    def correct(self, word, first=False, hits=None):
+        substitute = self.words.get(word.lower())
+        if substitute is not None:
+            word = substitute
+            if hits is not None:
+                hits[self.field + ":words:" + substitute] += 1
+
+        if self.table is not None:
+            fixed = word.translate(self.table)
+            if hits is not None and fixed != word:
+                hits[self.field + ":characters"] += 1
+            word = fixed
+
+        for rule in self.patterns:
+            if rule.first and not first:
+                continue
+            word, count = rule.apply(word)
+            if count and hits is not None:
+                hits[self.field + ":" + rule.name] += count
+
+        # titlecase if all lower
+        if self.titlecase and word.lower() == word:
+            word = word.title()
+        return word
+
+
+class CorrectionRules(object):
+    """
+    OCR correction rule set, one FieldCorrections per field type, with per rule hit counters.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.fields = {field: FieldCorrections(field, **options) for field, options in self.rules.items()}
+        self.hits = Counter()
+
+    @classmethod
+    def from_config(cls, rules):
+        # fields missing from configuration keep their default rules
+        merged = dict(DEFAULT_RULES)
+        merged.update(rules or {})
+        return cls(merged)
+
+    def correct(self, field, word, first=False):
+        corrections = self.fields.get(field)
+        if corrections is None:
+            return word
+        return corrections.correct(word, first, self.hits)
+
+    def stats(self):
+        return dict(self.hits)
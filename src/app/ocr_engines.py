@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# coding: utf-8
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from PIL import Image
+from pytesseract import pytesseract
+from pytesseract import Output
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+ENGINE_PYTESSERACT = "pytesseract"
+ENGINE_TESSEROCR = "tesserocr"
+
+# keys of pytesseract.image_to_data DICT output
+DATA_KEYS = [
+    "level",
+    "page_num",
+    "block_num",
+    "par_num",
+    "line_num",
+    "word_num",
+    "left",
+    "top",
+    "width",
+    "height",
+    "conf",
+    "text",
+]
+
+
+class OcrEngine(ABC):
+    """
+    OCR backend returning the pytesseract image_to_data DICT structure.
+    """
+
+    @abstractmethod
+    def image_to_data(self, image, config):
+        pass
+
+    def close(self):
+        pass
+
+
+class PytesseractEngine(OcrEngine):
+    """
+    Default engine: spawns one tesseract process per image.
+    """
+
+    def __init__(self, path_to_tesseract=None):
+        if path_to_tesseract:
+            pytesseract.tesseract_cmd = path_to_tesseract
+
+    def image_to_data(self, image, config):
+        return pytesseract.image_to_data(image, output_type=Output.DICT, config=config)
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    In-process engine based on the tesserocr binding of the tesseract API.
+    Language models are loaded once per thread and reused for every image.
+    """
+
+    def __init__(self, tessdata=None):
+        if tesserocr is None:
+            raise ImportError("tesserocr is not installed, see requirements-optional.txt")
+        self.tessdata = tessdata
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_config(config):
+        # translate tesseract command line options (-l, --oem, --psm) to API settings
+        options = {"lang": "eng", "oem": tesserocr.OEM.DEFAULT, "psm": tesserocr.PSM.AUTO}
+        parts = config.split()
+        for i, part in enumerate(parts[:-1]):
+            if part == "-l":
+                options["lang"] = parts[i + 1]
+            elif part == "--oem":
+                options["oem"] = int(parts[i + 1])
+            elif part == "--psm":
+                options["psm"] = int(parts[i + 1])
+        return options
+
+    def get_api(self, config):
+        # tesseract API instances are not thread safe: keep one per thread and configuration
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        api = apis.get(config)
+        if api is None:
+            options = self.parse_config(config)
+            kwargs = {"path": self.tessdata} if self.tessdata else {}
+            api = tesserocr.PyTessBaseAPI(lang=options["lang"], oem=options["oem"], psm=options["psm"], **kwargs)
+            apis[config] = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def image_to_data(self, image, config):
+        api = self.get_api(config)
+        # same conversion as pytesseract for numpy arrays
+        picture = Image.fromarray(image) if not isinstance(image, Image.Image) else image
+        api.SetImage(picture)
+        api.Recognize()
+
+        data = {key: [] for key in DATA_KEYS}
+
+        def add(level, block, par, line, word, box, conf, text):
+            x1, y1, x2, y2 = box
+            for key, value in zip(
+                DATA_KEYS, [level, 1, block, par, line, word, x1, y1, x2 - x1, y2 - y1, conf, text]
+            ):
+                data[key].append(value)
+
+        width, height = picture.size
+        add(1, 0, 0, 0, 0, (0, 0, width, height), -1, "")
+
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        RIL = tesserocr.RIL
+        block = par = line = word = 0
+        for result in tesserocr.iterate_level(iterator, RIL.WORD):
+            # emit layout rows the same way tesseract TSV output does
+            if result.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+                add(2, block, par, line, word, result.BoundingBox(RIL.BLOCK), -1, "")
+            if result.IsAtBeginningOf(RIL.PARA):
+                par, line, word = par + 1, 0, 0
+                add(3, block, par, line, word, result.BoundingBox(RIL.PARA), -1, "")
+            if result.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+                add(4, block, par, line, word, result.BoundingBox(RIL.TEXTLINE), -1, "")
+
+            box = result.BoundingBox(RIL.WORD)
+            if box is None:
+                continue
+            word += 1
+            add(5, block, par, line, word, box, result.Confidence(RIL.WORD), result.GetUTF8Text(RIL.WORD))
+
+        return data
+
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
+        self._local = threading.local()
+
+
+def get_engine(name, path_to_tesseract=None, tessdata=None):
+    """
+    Build the configured OCR engine, falling back to pytesseract when tesserocr is unavailable.
+    """
+    if name == ENGINE_TESSEROCR:
+        if tesserocr is None:
+            logging.warning("tesserocr is not installed (see requirements-optional.txt), falling back to pytesseract")
+        else:
+            if tessdata is None and path_to_tesseract:
+                # windows installers ship tessdata next to the executable
+                candidate = os.path.join(os.path.dirname(path_to_tesseract), "tessdata")
+                tessdata = candidate if os.path.isdir(candidate) else None
+            return TesserocrEngine(tessdata)
+    return PytesseractEngine(path_to_tesseract)
+
+
+def merge_data(parts, width, height):
+    """
+    Merge image_to_data results of several regions of the same image into a single result.
+    parts is a list of (data, (x, y)) in reading order, where (x, y) is the region origin: word boxes are
+    moved back to image coordinates and block numbers are renumbered to stay unique.
+    """
+    merged = {key: [] for key in DATA_KEYS}
+    for key, value in zip(DATA_KEYS, [1, 1, 0, 0, 0, 0, 0, 0, width, height, -1, ""]):
+        merged[key].append(value)
+
+    block_offset = 0
+    for data, (x, y) in parts:
+        last_block = 0
+        for i in range(len(data["text"])):
+            # a single page row is kept for the whole image
+            if data["level"][i] == 1:
+                continue
+            for key in DATA_KEYS:
+                value = data[key][i]
+                if key == "left":
+                    value += x
+                elif key == "top":
+                    value += y
+                elif key == "block_num":
+                    last_block = max(last_block, value)
+                    value += block_offset
+                merged[key].append(value)
+        block_offset += last_block
+
+    return merged
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# coding: utf-8
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+# planning columns, in reading order
+COLUMN_DAY = 0
+COLUMN_DATE = 1
+COLUMN_TIME = 2
+COLUMN_DESCRIPTION = 3
+COLUMNS = 4
+
+# words below this tesseract confidence flag their line
+MIN_CONFIDENCE = 60
+
+LAYOUT_KEYS = ("level", "block_num", "par_num", "line_num", "left", "width", "conf", "text")
+
+OcrLine = namedtuple("OcrLine", ["key", "top", "words", "confs", "columns", "min_conf", "low_confidence"])
+
+
+def has_layout(details):
+    return all(key in details for key in LAYOUT_KEYS)
+
+
+def split_lines(details):
+    """
+    Legacy line reconstruction from the text list only: a line ends on the first empty string after a word.
+    Columns are given by word position.
+    """
+    lines = []
+    words = []
+    for word in list(details["text"]) + [""]:
+        if word != "":
+            words.append(word)
+        elif words:
+            columns = ((words[0],), tuple(words[1:2]), tuple(words[2:3]), tuple(words[3:]))
+            lines.append(OcrLine(None, None, tuple(words), None, columns, None, False))
+            words = []
+    return lines
+
+
+def column_gutters(left, right, lines, min_gap):
+    """
+    Find the vertical gutters separating columns: x ranges covered by (almost) no word box.
+    Returns the middle of the first COLUMNS - 1 gutters at least min_gap wide, from left to right.
+    """
+    delta = np.zeros(int(right.max()) + 2, dtype=np.int64)
+    np.add.at(delta, left, 1)
+    np.add.at(delta, right, -1)
+    coverage = np.cumsum(delta)[int(left.min()) : int(right.max())]
+
+    # tolerate a few stray words crossing a gutter
+    free = np.concatenate(([0], (coverage <= lines // 10).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(free))
+    runs = edges.reshape(-1, 2)
+    runs = runs[(runs[:, 1] - runs[:, 0]) >= min_gap][: COLUMNS - 1]
+    return list(int(left.min()) + (runs[:, 0] + runs[:, 1]) / 2)
+
+
+def column_boundaries(starts, ends, counts):
+    """
+    Fallback column positions: halfway between the median end of word k-1 and the median start of word k,
+    over the lines having at least k + 1 words.
+    """
+    boundaries = []
+    for k in range(1, COLUMNS):
+        having = counts > k
+        if not np.any(having):
+            boundaries.append(np.inf)
+            continue
+        boundary = (np.median(ends[having, k - 1]) + np.median(starts[having, k])) / 2
+        boundaries.append(max(boundary, boundaries[-1]) if boundaries else boundary)
+    return np.array(boundaries)
+
+
+def build_lines(details, min_conf=MIN_CONFIDENCE):
+    """
+    Group tesseract words into lines using their block / paragraph / line numbers and assign each
+    word to the day, date, time or description column from its x position.
+    Lines are returned in tesseract reading order, lines with a word below min_conf are flagged.
+    """
+    if not has_layout(details):
+        return split_lines(details)
+
+    text = np.asarray(details["text"], dtype=object)
+    level = np.asarray(details["level"], dtype=np.int64)
+    stripped = np.array([str(word).strip() for word in text], dtype=object)
+    is_word = (level == 5) & (stripped != "")
+    if not np.any(is_word):
+        return []
+
+    index = np.flatnonzero(is_word)
+    block = np.asarray(details["block_num"], dtype=np.int64)[index]
+    par = np.asarray(details["par_num"], dtype=np.int64)[index]
+    line = np.asarray(details["line_num"], dtype=np.int64)[index]
+    left = np.asarray(details["left"], dtype=np.int64)[index]
+    right = left + np.asarray(details["width"], dtype=np.int64)[index]
+    top = np.asarray(details["top"], dtype=np.int64)[index] if "top" in details else np.zeros(len(index), np.int64)
+    conf = np.asarray(details["conf"], dtype=float)[index]
+    words = stripped[index]
+
+    # one integer key per line, lines keep the order of their first word
+    keys = (block << 32) | (par << 16) | line
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    line_of_word = rank[inverse.ravel()]
+
+    # words sorted by line then x position
+    sort = np.lexsort((left, line_of_word))
+    line_of_word, left, right, top, conf, words = (
+        line_of_word[sort], left[sort], right[sort], top[sort], conf[sort], words[sort]
+    )
+    bounds = np.flatnonzero(np.diff(line_of_word)) + 1
+    starts_at = np.concatenate(([0], bounds))
+    counts = np.diff(np.concatenate((starts_at, [len(words)])))
+
+    # first COLUMNS word boxes of every line, used to estimate column positions
+    position = np.arange(len(words)) - np.repeat(starts_at, counts)
+    head = position < COLUMNS
+    starts = np.full((len(counts), COLUMNS), np.nan)
+    ends = np.full((len(counts), COLUMNS), np.nan)
+    starts[line_of_word[head], position[head]] = left[head]
+    ends[line_of_word[head], position[head]] = right[head]
+    boundaries = column_gutters(left, right, len(counts), max(5, int(right.max()) // 100))
+    if len(boundaries) < COLUMNS - 1:
+        boundaries = column_boundaries(starts, ends, counts)
+
+    column = np.searchsorted(boundaries, left, side="right")
+    # a word never goes back to a previous column, and the first word of a line is always the day
+    column = np.maximum.accumulate(np.where(position == 0, 0, column) + line_of_word * COLUMNS) - line_of_word * COLUMNS
+
+    lines = []
+    for i, (start, count) in enumerate(zip(starts_at, counts)):
+        stop = start + count
+        line_columns = column[start:stop]
+        line_words = words[start:stop]
+        columns = tuple(tuple(line_words[line_columns == c]) for c in range(COLUMNS))
+        confs = tuple(conf[start:stop])
+        min_line_conf = min(confs)
+        low_confidence = min_line_conf < min_conf
+        if low_confidence:
+            logging.warning("Low confidence line (" + "{:.0f}".format(min_line_conf) + "): " + " ".join(line_words))
+        lines.append(
+            OcrLine(
+                int(unique[order[i]]),
+                int(top[start:stop].min()),
+                tuple(line_words),
+                confs,
+                columns,
+                min_line_conf,
+                low_confidence,
+            )
+        )
+    return lines
+
+
+def line_boxes(details, min_conf=MIN_CONFIDENCE):
+    """
+    Bounding box and confidence of every line having a word below min_conf.
+    Returns a list of ((block, par, line), (x, y, w, h), mean confidence) in reading order.
+    """
+    if not has_layout(details) or "top" not in details or "height" not in details:
+        return []
+
+    level = np.asarray(details["level"], dtype=np.int64)
+    text = np.array([str(word).strip() for word in details["text"]], dtype=object)
+    index = np.flatnonzero((level == 5) & (text != ""))
+    if not len(index):
+        return []
+
+    block = np.asarray(details["block_num"], dtype=np.int64)[index]
+    par = np.asarray(details["par_num"], dtype=np.int64)[index]
+    line = np.asarray(details["line_num"], dtype=np.int64)[index]
+    left = np.asarray(details["left"], dtype=np.int64)[index]
+    top = np.asarray(details["top"], dtype=np.int64)[index]
+    right = left + np.asarray(details["width"], dtype=np.int64)[index]
+    bottom = top + np.asarray(details["height"], dtype=np.int64)[index]
+    conf = np.asarray(details["conf"], dtype=float)[index]
+
+    keys = (block << 32) | (par << 16) | line
+    sort = np.argsort(keys, kind="stable")
+    keys, left, top, right, bottom, conf, first = (
+        keys[sort], left[sort], top[sort], right[sort], bottom[sort], conf[sort], index[sort]
+    )
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    counts = np.diff(np.concatenate((starts, [len(keys)])))
+
+    x1 = np.minimum.reduceat(left, starts)
+    y1 = np.minimum.reduceat(top, starts)
+    x2 = np.maximum.reduceat(right, starts)
+    y2 = np.maximum.reduceat(bottom, starts)
+    min_confs = np.minimum.reduceat(conf, starts)
+    mean_confs = np.add.reduceat(conf, starts) / counts
+    first = np.minimum.reduceat(first, starts)
+
+    boxes = []
+    for i in np.argsort(first, kind="stable"):
+        if min_confs[i] >= min_conf:
+            continue
+        key = int(keys[starts[i]])
+        boxes.append(
+            (
+                (key >> 32, (key >> 16) & 0xFFFF, key & 0xFFFF),
+                (int(x1[i]), int(y1[i]), int(x2[i] - x1[i]), int(y2[i] - y1[i])),
+                float(mean_confs[i]),
+            )
+        )
+    return boxes
+
+
+def splice_lines(details, replacements):
+    """
+    Replace the words of some lines by new word rows.
+    replacements maps (block, par, line) to a list of row dicts (same keys as details), inserted where
+    the first word of the original line was.
+    """
+    if not replacements:
+        return details
+
+    keys = list(details.keys())
+    spliced = {key: [] for key in keys}
+    done = set()
+    for i in range(len(details["text"])):
+        line = (details["block_num"][i], details["par_num"][i], details["line_num"][i])
+        if details["level"][i] == 5 and line in replacements:
+            if line not in done:
+                done.add(line)
+                for row in replacements[line]:
+                    for key in keys:
+                        spliced[key].append(row[key])
+            continue
+        for key in keys:
+            spliced[key].append(details[key][i])
+    return spliced
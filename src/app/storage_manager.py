@@ -85,6 +85,8 @@ class MicrosoftStorageManager(StorageManager):
         uploaded_items = []
         if folder_item:
             for local_path in local_file_paths:
+                # accepts paths as well as image handles
+                local_path = os.fspath(local_path)
                 logging.info('Uploading: ' + local_path)
                 item = folder_item.upload_file(item=local_path)
                 uploaded_items.append(item)
@@ -43,14 +43,18 @@ def write_to_csv(filename, data):
         writer.writerow(data)
 
 
-def empty_folder(folder):
+def empty_folder(folder, keep=None):
+    # keep: file paths which must survive the cleanup (e.g. persistent caches)
+    keep = [os.path.abspath(path) for path in keep] if keep else []
     for filename in os.listdir(folder):
         file_path = os.path.join(folder, filename)
         try:
+            if os.path.abspath(file_path) in keep:
+                continue
             if os.path.isfile(file_path) or os.path.islink(file_path):
                 os.unlink(file_path)
             elif os.path.isdir(file_path):
-                empty_folder(file_path)
+                empty_folder(file_path, keep)
         except Exception as e:
             logging.info("Failed to delete %s. Reason: %s" % (file_path, e))
 
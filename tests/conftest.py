@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from french_dates import ZoneInfo, TIMEZONE
+from image_parser import DanceEvent
+
+
+@pytest.fixture
+def events():
+    # two weeks of evenings, one event per day, raw OCR words attached
+    first = datetime(2022, 11, 7, 20, 0, tzinfo=ZoneInfo(TIMEZONE))
+    return [
+        DanceEvent(
+            first + timedelta(days=i),
+            "Soirée " + str(i),
+            first + timedelta(days=i, hours=3),
+            location="Paris" if i % 2 else "Lyon",
+            dances=["WCS"] if i % 3 else ["Rock", "WCS"],
+            raw=["Lundi", str(i), "20h-23h", "Soirée"],
+        )
+        for i in range(14)
+    ]
@@ -0,0 +1,46 @@
+import asyncio
+
+import async_db
+import db
+from event_query import EventQuery
+
+
+def test_async_in_memory_upsert_counts(events):
+    documents = [event.to_json_storage() for event in events]
+
+    async def ingest():
+        storage = async_db.AsyncInMemoryStorage(store_raw=True, delay=0.001)
+        await storage.ensure_indexes()
+        # concurrent batches are serialized on the adapter thread
+        first = await asyncio.gather(*(storage.upsert_many(documents[i : i + 5], 5) for i in range(0, 14, 5)))
+        second = await storage.upsert_many(documents)
+        raw = storage.storage.get_raw(events[0].storage_key)
+        await storage.close()
+        return first, second, raw
+
+    first, second, raw = asyncio.run(ingest())
+    assert sum(counts["inserted"] for counts in first) == 14
+    assert second == {"inserted": 0, "updated": 0, "unchanged": 14, "errors": 0}
+    assert raw == events[0].raw
+
+
+def test_background_writer_sums_counts(events):
+    storage = db.InMemoryStorage()
+    writer = async_db.BackgroundWriter(async_db.AsyncStorageAdapter(storage), batch_size=4)
+    writer.submit(event.to_json_storage() for event in events[:10])
+    writer.submit(event.to_json_storage() for event in events[5:])
+    writer.submit([])
+
+    assert writer.close() == {"inserted": 14, "updated": 0, "unchanged": 5, "errors": 0}
+    assert storage.count_events(EventQuery()) == 14
+
+
+def test_adapter_leaves_wrapped_storage_open(events, tmp_path):
+    storage = db.SQLiteStorage(str(tmp_path / "events.sqlite"))
+    writer = async_db.BackgroundWriter(async_db.AsyncStorageAdapter(storage))
+    writer.submit(event.to_json_storage() for event in events)
+    writer.close()
+
+    # still usable by its owner after the writer is closed
+    assert storage.apply_retention(30, db.RETENTION_PURGE) == 14
+    storage.close()
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+import pytest
+
+import image_utils
+from classification_cache import ClassificationCache
+from image_utils import ClassificationResult
+
+
+def poster(path, hue, width=600, height=800):
+    # horizontal bands getting brighter: the grayscale hash only depends on the layout, not on the hue
+    hsv = np.zeros((height, width, 3), np.uint8)
+    hsv[..., 0] = hue
+    hsv[..., 1] = 200
+    hsv[..., 2] = (np.arange(width) * 255 // width).astype(np.uint8)[None, :]
+    hsv[height // 3 : height // 2, :, 1] = 0
+    cv2.imwrite(str(path), cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR))
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def classified(cache, path, settings="settings"):
+    result = ClassificationResult(path, 50.0, image_utils.MATCH_TOP, image_utils.METHOD_EXACT, "blue", {"blue": 50.0})
+    cache.put_classification(result, settings)
+    return result
+
+
+def test_content_hash_hit(cache, tmp_path):
+    path = poster(tmp_path / "a.png", 100)
+    classified(cache, path)
+    assert cache.get_classification(path, "settings").bucket == image_utils.MATCH_TOP
+    assert cache.get_classification(path, "other settings") is None
+
+
+def test_reencoded_copy_hit(cache, tmp_path):
+    classified(cache, poster(tmp_path / "a.png", 100))
+    copy = str(tmp_path / "copy.jpg")
+    cv2.imwrite(copy, cv2.resize(cv2.imread(str(tmp_path / "a.png")), (450, 600)), [cv2.IMWRITE_JPEG_QUALITY, 80])
+
+    result = cache.get_classification(copy, "settings")
+    assert result is not None and result.path == copy
+
+
+def test_color_variant_with_same_phash_misses(cache, tmp_path):
+    original = poster(tmp_path / "a.png", 100)
+    variant = poster(tmp_path / "b.png", 10)
+    assert image_utils.perceptual_hash(original) == image_utils.perceptual_hash(variant)
+
+    classified(cache, original)
+    assert cache.get_classification(variant, "settings") is None
+
+
+def test_other_aspect_ratio_with_same_phash_misses(cache, tmp_path):
+    original = poster(tmp_path / "a.png", 100)
+    wider = poster(tmp_path / "b.png", 100, width=800)
+    assert image_utils.perceptual_hash(original) == image_utils.perceptual_hash(wider)
+
+    classified(cache, original)
+    assert cache.get_classification(wider, "settings") is None
@@ -0,0 +1,40 @@
+import threading
+from datetime import date, time
+
+from french_dates import FrenchDateParser
+
+
+def test_dates_without_year_follow_today():
+    parser = FrenchDateParser()
+    assert parser.parse_date("12/11", date(2022, 5, 1)).year == 2022
+    assert parser.parse_date("12/11", date(2023, 5, 1)).year == 2023
+    assert parser.parse_date("12 novembre 2021", date(2023, 5, 1)).year == 2021
+
+
+def test_times():
+    parser = FrenchDateParser()
+    assert parser.parse_time("20h30").replace(tzinfo=None) == time(20, 30)
+    assert parser.parse_time("21h").replace(tzinfo=None) == time(21, 0)
+
+
+def test_shared_parser_with_small_cache():
+    # caches are cleared while other threads read them
+    parser = FrenchDateParser(cache_size=8)
+    texts = [str(day) + "/" + str(month) for day in range(1, 29) for month in range(1, 13)]
+    errors = []
+
+    def run():
+        try:
+            for _ in range(5):
+                for text in texts:
+                    assert parser.parse_date(text, date(2022, 1, 1)) is not None
+                    assert parser.parse_time("20h30") is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,18 @@
+from image_parser import DancePlanningParser, PARSE_OK
+
+
+def test_process_many_reports_added_events(events):
+    # two posters sharing two events
+    posters = {"first": events[:5], "second": events[3:8]}
+    parser = DancePlanningParser(None)
+    parser.extract = lambda image: (list(posters[image]), {})
+
+    results = {result.image: result for result in parser.process_many(list(posters), workers=2)}
+    parser.close()
+
+    assert all(result.status == PARSE_OK for result in results.values())
+    assert sum(len(result.added) for result in results.values()) == 8
+    assert {event.storage_key for result in results.values() for event in result.added} == {
+        event.storage_key for event in events[:8]
+    }
+    assert parser.planning.count() == 8
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+import image_utils
+from image_utils import ColorProfile
+
+# planning profile of config/settings.yml and a wider range crossing more hues
+RANGES = [((90, 30, 253), (97, 90, 255)), ((0, 100, 100), (20, 255, 255))]
+
+
+def sample_image(seed=0):
+    """
+    Random BGR pixels plus pixels converted from colors on and around the range bounds,
+    where rounding differences between both detectors would show.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(256, 256, 3), dtype=np.uint8)
+    near = []
+    for lower_hsv, upper_hsv in RANGES:
+        low = np.maximum(np.array(lower_hsv) - 3, 0)
+        high = np.minimum(np.array(upper_hsv) + 3, [179, 255, 255])
+        near.append(rng.integers(low, high + 1, size=(64, 256, 3)).astype(np.uint8))
+    hsv = np.concatenate(near)
+    return np.concatenate([noise, cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)])
+
+
+@pytest.mark.parametrize("lower_hsv, upper_hsv", RANGES)
+def test_lookup_mask_matches_cvtcolor_inrange(lower_hsv, upper_hsv):
+    image = sample_image()
+    detector = image_utils.ColorLookupDetector(lower_hsv, upper_hsv)
+    reference = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), np.array(lower_hsv), np.array(upper_hsv))
+
+    assert np.count_nonzero(reference) > 0
+    assert detector.check(image) == 0.0
+    assert np.array_equal(detector.mask(image), reference)
+    assert detector.count(image) == np.count_nonzero(reference)
+
+
+def test_profile_lookup_counts_match_inrange():
+    image = sample_image(1)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    detector = image_utils.ProfileLookupDetector(RANGES)
+
+    expected = [np.count_nonzero(cv2.inRange(hsv, np.array(low), np.array(high))) for low, high in RANGES]
+    assert list(detector.counts(image)) == expected
+
+
+def test_profile_ratios_same_for_both_detectors():
+    image = sample_image(2)
+    profiles = [ColorProfile(str(i), low, high, 45, 40) for i, (low, high) in enumerate(RANGES)]
+
+    hsv = image_utils.get_profile_ratios(image, profiles, image_utils.DETECTOR_HSV)
+    lut = image_utils.get_profile_ratios(image, profiles, image_utils.DETECTOR_LUT)
+    assert lut == pytest.approx(hsv)
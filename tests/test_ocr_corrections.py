@@ -0,0 +1,85 @@
+import re
+
+import pytest
+
+from ocr_corrections import CorrectionRules, FIELD_DATE, FIELD_DESCRIPTION, FIELD_TIME
+
+
+# hard coded fixes of the parser before the rules were data driven, kept as reference
+def legacy_date(word):
+    return word.replace("S", "5").replace("I", "1").replace("O", "0").replace("§", "5").replace("T", "7")
+
+
+def legacy_time(word):
+    word = legacy_date(word)
+    word = word.replace("h", ":")
+    return word.replace("24:00", "00:00")
+
+
+def legacy_description(word, first):
+    if word.lower() == "wes":
+        word = "WCS"
+    elif word.lower() == "dj":
+        word = "DJ"
+    elif word.lower() == "sbk":
+        word = "SBK"
+
+    word = word.replace("‘", "'").replace("’", "'").replace("“", '"').replace("”", '"')
+    word = word.replace("I'", "L'")
+    word = word.replace("lmpasse", "Impasse")
+
+    if re.compile(r"^([a-zA-Z]')").search(word):
+        word = word[0:2].upper() + word[2:]
+
+    if first and word[0:1] == "'":
+        if re.compile(r"^'[aeiouyAEIOUYÀ-ſ]+").search(word):
+            word = "L" + word
+        else:
+            word = word.lstrip("'")
+
+    if word.lower() == word:
+        word = word.title()
+    return word
+
+
+DATES = ["12/11", "I2/II/2O22", "§/1T", "S/O1", "31/12/2022", "1er", ""]
+TIMES = ["20h30-24h00", "2Oh-O1h", "21:00", "T:3O", "24:00", "20h", "I9hI5-23h"]
+DESCRIPTIONS = [
+    "wes", "Dj", "SBK", "soirée", "l'impasse", "I'atelier", "lmpasse", "‘Salsa’", "“Bachata”", "'atelier",
+    "'salle", "''ecole", "d'été", "Rock", "x'y", "'", "Élan", "'Été", "stage-débutant", "ROCK", "",
+]
+
+
+@pytest.mark.parametrize("word", DATES)
+def test_date_corrections_match_legacy(word):
+    assert CorrectionRules().correct(FIELD_DATE, word) == legacy_date(word)
+
+
+@pytest.mark.parametrize("word", TIMES)
+def test_time_corrections_match_legacy(word):
+    assert CorrectionRules().correct(FIELD_TIME, word) == legacy_time(word)
+
+
+@pytest.mark.parametrize("word", DESCRIPTIONS)
+@pytest.mark.parametrize("first", [True, False])
+def test_description_corrections_match_legacy(word, first):
+    assert CorrectionRules().correct(FIELD_DESCRIPTION, word, first=first) == legacy_description(word, first)
+
+
+def test_hits_are_counted_per_rule():
+    rules = CorrectionRules()
+    rules.correct(FIELD_TIME, "20h-24h00")
+    rules.correct(FIELD_DESCRIPTION, "wes")
+    rules.correct(FIELD_DESCRIPTION, "'atelier", first=True)
+
+    hits = rules.stats()
+    assert hits["time:characters"] == 1
+    assert hits["time:midnight"] == 1
+    assert hits["description:words:WCS"] == 1
+    assert hits["description:missing-l"] == 1
+
+
+def test_from_config_keeps_default_fields():
+    rules = CorrectionRules.from_config({FIELD_DESCRIPTION: {"words": {"wcs": "West Coast Swing"}}})
+    assert rules.correct(FIELD_DESCRIPTION, "WCS") == "West Coast Swing"
+    assert rules.correct(FIELD_DATE, "I2/II") == "12/11"
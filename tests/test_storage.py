@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+import db
+from event_query import EventQuery
+from french_dates import ZoneInfo, TIMEZONE
+
+
+@pytest.fixture(params=[db.BACKEND_MEMORY, db.BACKEND_SQLITE])
+def storage(request, tmp_path):
+    storage = db.get_storage(request.param, sqlite_file=str(tmp_path / "events.sqlite"), store_raw=True)
+    storage.ensure_indexes()
+    yield storage
+    storage.close()
+
+
+def test_upsert_counts(storage, events):
+    documents = [event.to_json_storage() for event in events]
+    assert storage.upsert_many(documents, batch_size=5) == {"inserted": 14, "updated": 0, "unchanged": 0, "errors": 0}
+    assert storage.upsert_many(documents, batch_size=5) == {"inserted": 0, "updated": 0, "unchanged": 14, "errors": 0}
+
+    events[0].location = "Marseille"
+    documents = [event.to_json_storage() for event in events]
+    assert storage.upsert_many(documents) == {"inserted": 0, "updated": 1, "unchanged": 13, "errors": 0}
+    assert storage.count_events(EventQuery()) == 14
+
+
+def test_upsert_duplicate_keys_in_batch(storage, events):
+    documents = [events[0].to_json_storage(), events[0].to_json_storage(), events[1].to_json_storage()]
+    assert storage.upsert_many(documents) == {"inserted": 2, "updated": 0, "unchanged": 1, "errors": 0}
+
+
+def test_raw_is_stored_apart(storage, events):
+    storage.upsert_many(event.to_json_storage() for event in events)
+    document = next(storage.find_events(EventQuery()))
+    assert db.RAW_FIELD not in document
+    assert storage.get_raw(events[0].storage_key) == events[0].raw
+
+
+def test_find_events(storage, events):
+    storage.upsert_many(event.to_json_storage() for event in events)
+    tzinfo = ZoneInfo(TIMEZONE)
+
+    query = EventQuery(start=datetime(2022, 11, 10, tzinfo=tzinfo), end=datetime(2022, 11, 14, tzinfo=tzinfo))
+    assert [document["description"] for document in storage.find_events(query)] == [
+        "Soirée 3", "Soirée 4", "Soirée 5", "Soirée 6"
+    ]
+    assert storage.count_events(EventQuery(location="paris")) == 7
+    assert storage.count_events(EventQuery(dances=["Rock"])) == 5
+    assert storage.count_events(EventQuery.days(datetime(2022, 11, 12).date(), 2)) == 2
+
+    pages = [storage.find_page(EventQuery(page_size=5), page) for page in range(3)]
+    assert [len(page) for page in pages] == [5, 5, 4]
+
+
+def test_retention(storage, events):
+    storage.upsert_many(event.to_json_storage() for event in events)
+    assert storage.apply_retention(30, db.RETENTION_ARCHIVE) == 14
+    assert storage.count_events(EventQuery()) == 0